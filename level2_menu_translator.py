@@ -64,20 +64,19 @@ def match_casing(src, dst):
         return " ".join(w.capitalize() for w in dst.split())
     return dst
 
+PHRASE_SPAN = re.compile(r"\b[\wÀ-ÖØ-öø-ÿ]+(?:\s+[\wÀ-ÖØ-öø-ÿ]+)+\b", flags=re.UNICODE)
+
 def replace_phrases(text):
-    items = sorted(NORM_PHRASES.items(), key=lambda kv: -len(kv[0]))
-    pattern = re.compile(r"\b[\wÀ-ÖØ-öø-ÿ]+(?:\s+[\wÀ-ÖØ-öø-ÿ]+)+\b", flags=re.UNICODE)
-    out = text
-    for norm_src, dst in items:
-        if normalize(out) == norm_src:
-            return match_casing(out, dst)
-        def repl(m):
-            span = m.group(0)
-            if normalize(span) == norm_src:
-                return match_casing(span, dst)
-            return span
-        out = pattern.sub(repl, out)
-    return out
+    dst = NORM_PHRASES.get(normalize(text))
+    if dst is not None:
+        return match_casing(text, dst)
+    def repl(m):
+        span = m.group(0)
+        dst = NORM_PHRASES.get(normalize(span))
+        if dst is not None:
+            return match_casing(span, dst)
+        return span
+    return PHRASE_SPAN.sub(repl, text)
 
 def translate_word(w):
     base = normalize(w)
@@ -70,25 +70,24 @@ def match_casing(src, dst):
         return " ".join(w.capitalize() for w in dst.split())
     return dst  # Keep as lowercase or mixed case
 
+# Multi-word spans (runs of words separated only by whitespace), compiled once
+PHRASE_SPAN = re.compile(r"\b[\wÀ-ÖØ-öø-ÿ]+(?:\s+[\wÀ-ÖØ-öø-ÿ]+)+\b", flags=re.UNICODE)
+
 # Function to replace full phrases before word-by-word translation
 def replace_phrases(text):
-    items = sorted(NORM_PHRASES.items(), key=lambda kv: -len(kv[0]))  # Longest-first
-    pattern = re.compile(r"\b[\wÀ-ÖØ-öø-ÿ]+(?:\s+[\wÀ-ÖØ-öø-ÿ]+)+\b", flags=re.UNICODE)  # Multi-word spans
-    out = text  # Start with original text
-
-    for norm_src, dst in items:
-        if normalize(out) == norm_src:  # If entire line matches a phrase
-            return match_casing(out, dst)
+    dst = NORM_PHRASES.get(normalize(text))  # If entire line matches a phrase
+    if dst is not None:
+        return match_casing(text, dst)
 
-        # Replace phrase segments that match normalized keys
-        def repl(m):
-            span = m.group(0)
-            if normalize(span) == norm_src:
-                return match_casing(span, dst)
-            return span
+    # Single pass: normalize each span once and look it up in the phrase table
+    def repl(m):
+        span = m.group(0)
+        dst = NORM_PHRASES.get(normalize(span))
+        if dst is not None:
+            return match_casing(span, dst)
+        return span
 
-        out = pattern.sub(repl, out)
-    return out
+    return PHRASE_SPAN.sub(repl, text)
 
 # Function to translate a single word
 def translate_word(w):
@@ -76,28 +76,25 @@ def match_casing(src, dst):
         return " ".join(w.capitalize() for w in dst.split())
     return dst  # Keep original lower/mixed case
 
-# Function to replace known phrases (longest-first) using normalized matching
+# Multi-word spans (runs of words separated only by whitespace), compiled once
+PHRASE_SPAN = re.compile(r"\b[\wÀ-ÖØ-öø-ÿ]+(?:\s+[\wÀ-ÖØ-öø-ÿ]+)+\b", flags=re.UNICODE)
+
+# Function to replace known phrases using normalized matching in a single pass
 def replace_phrases(text, mapping_norm):
-    items = sorted(mapping_norm.items(), key=lambda kv: -len(kv[0]))  # Longest phrase first
-    pattern = re.compile(
-        r"\b[\wÀ-ÖØ-öø-ÿ]+(?:\s+[\wÀ-ÖØ-öø-ÿ]+)+\b", flags=re.UNICODE
-    )  # Multi-word spans
-    out = text  # Work on a copy of the input
-
-    for norm_src, dst in items:
-        # If the entire line matches a phrase once normalized, replace all of it
-        if normalize(out) == norm_src:
-            return match_casing(out, dst)
-
-        # Otherwise, scan candidate spans and replace the ones that match when normalized
-        def repl(m):
-            span = m.group(0)  # Candidate phrase fragment
-            if normalize(span) == norm_src:  # Normalized equality means it's our phrase
-                return match_casing(span, dst)  # Replace while preserving casing
-            return span  # Keep original if not our phrase
-
-        out = pattern.sub(repl, out)  # Apply the replacement across the line
-    return out  # Return the phrase-processed text
+    # If the entire line matches a phrase once normalized, replace all of it
+    dst = mapping_norm.get(normalize(text))
+    if dst is not None:
+        return match_casing(text, dst)
+
+    # Otherwise, normalize each candidate span once and look it up directly
+    def repl(m):
+        span = m.group(0)  # Candidate phrase fragment
+        dst = mapping_norm.get(normalize(span))  # Phrase table hit?
+        if dst is not None:
+            return match_casing(span, dst)  # Replace while preserving casing
+        return span  # Keep original if not a known phrase
+
+    return PHRASE_SPAN.sub(repl, text)  # One scan over the line
 
 # Function to translate words in a line after the phrase pass
 def translate_tokens(text, lex_norm, reverse=False):
@@ -1,83 +1,94 @@
+import hashlib
+import json
+import math
+import os
 import re
+import time
 import unicodedata
+import warnings
+from collections import namedtuple
+from enum import IntEnum
 
-PT_EN = {
-    "cardápio": "menu",
-    "menu": "menu",
-    "entrada": "starter",
-    "entradas": "starters",
-    "principal": "main",
-    "sobremesa": "dessert",
-    "bebida": "drink",
-    "bebidas": "drinks",
-    "água": "water",
-    "suco": "juice",
-    "refrigerante": "soda",
-    "cerveja": "beer",
-    "vinho": "wine",
-    "café": "coffee",
-    "chá": "tea",
-    "pão": "bread",
-    "manteiga": "butter",
-    "queijo": "cheese",
-    "frango": "chicken",
-    "carne": "beef",
-    "porco": "pork",
-    "peixe": "fish",
-    "peixes": "fish",
-    "salada": "salad",
-    "sopa": "soup",
-    "massa": "pasta",
-    "molho": "sauce",
-    "tomate": "tomato",
-    "batata": "potato",
-    "batatas": "potatoes",
-    "arroz": "rice",
-    "feijão": "beans",
-    "feijões": "beans",
-    "com": "with",
-    "sem": "without",
-    "e": "and",
-    "de": "of",
-}
+from menu_storage import Entry, open_compiled
 
-EN_PT = {v: k for k, v in PT_EN.items()}
-
-PHRASES_PT_EN = {
-    "prato principal": "main course",
-    "água com gás": "sparkling water",
-    "agua com gas": "sparkling water",
-    "águas com gás": "sparkling water",
-    "aguas com gas": "sparkling water",
-    "água sem gás": "still water",
-    "agua sem gas": "still water",
-    "batata frita": "french fries",
-    "batatas fritas": "french fries",
-    "molho de tomate": "tomato sauce",
-    "arroz e feijão": "rice and beans",
-    "arroz e feijao": "rice and beans",
+LEXICON_DIR = os.environ.get("MENU_LEXICON_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicon")
+LEXICON_SOURCES = {
+    "PT_EN": "pt_en",
+    "PHRASES_PT_EN": "phrases_pt_en",
+    "UNCOUNTABLE_EN": "uncountable_en",
+    "UNCOUNTABLE_PT": "uncountable_pt",
+    "NGRAM_PT": "ngrams_pt",
+    "NGRAM_EN": "ngrams_en",
 }
-
-PHRASES_EN_PT = {v: k for k, v in PHRASES_PT_EN.items()}
-
-UNCOUNTABLE_EN = {"rice", "fish", "water", "coffee", "tea", "bread"}
-UNCOUNTABLE_PT = {"arroz", "peixe", "água", "agua", "café", "cha", "chá", "pão"}
+SHARED_LEXICON = os.environ.get("MENU_LEXICON_SHARED")
+COMPILED_LEXICON = "lexicon.bin"
+IRREGULAR_EN = {
+    "potato": "potatoes",
+    "tomato": "tomatoes",
+    "mango": "mangoes",
+    "leaf": "leaves",
+    "loaf": "loaves",
+    "half": "halves",
+    "knife": "knives",
+    "child": "children",
+}
+IRREGULAR_PT = {
+    "pão": "pães",
+    "alemão": "alemães",
+    "capitão": "capitães",
+    "cão": "cães",
+    "mão": "mãos",
+    "irmão": "irmãos",
+    "grão": "grãos",
+    "cidadão": "cidadãos",
+}
+PT_PLURAL_SUFFIXES = (
+    ("ão", "ões"), ("al", "ais"), ("el", "éis"), ("ol", "óis"), ("ul", "uis"),
+    ("il", "is"), ("m", "ns"), ("r", "res"), ("z", "zes"),
+)
+PT_AO_PLURALS = ("oes", "aes", "aos")
+PLURAL_POS = ("", "noun", "adj")
+TRIGRAM_SMOOTHING = 0.5
+DETECT_PHRASE_WEIGHT = 3.0
+DETECT_TRIGRAM_SCALE = 0.25
+DETECT_TRIGRAM_CAP = 0.9
+DETECT_CONFIDENCE_SLOPE = 1.5
+DOC_SAMPLE_SIZE = 200
+DOC_CONFIDENCE = 0.8
+FUZZY_DISTANCE = 0
+FUZZY_MIN_LENGTH = 4
+FUZZY_PREFIX = 7
+WORD_VOTE_MEMO_SIZE = 100000
+TRANSLATOR_TABLES = ("NORM_PT_EN", "NORM_EN_PT", "NORM_PH_PT_EN", "NORM_PH_EN_PT", "PLURAL_PT_EN", "PLURAL_EN_PT", "TRIGRAMS", "WORD_LANG")
+PROFILE = None
+FUZZY_INDEXES = {}
+VOTES = None
 
 def normalize(s):
+    if s.isascii():
+        return s.lower()
+    if "Σ" in s:
+        return normalize_nfkd(s)
+    return s.translate(FOLD)
+
+def normalize_nfkd(s):
     nfkd = unicodedata.normalize("NFKD", s.lower())
     return "".join(c for c in nfkd if not unicodedata.combining(c))
 
-NORM_PT_EN = {normalize(k): v for k, v in PT_EN.items()}
-NORM_EN_PT = {normalize(k): v for k, v in EN_PT.items()}
-NORM_PH_PT_EN = {normalize(k): v for k, v in PHRASES_PT_EN.items()}
-NORM_PH_EN_PT = {normalize(k): v for k, v in PHRASES_EN_PT.items()}
+def fold_char(cp):
+    v = normalize_nfkd(chr(cp))
+    return ord(v) if len(v) == 1 else v
 
-def match_casing(src, dst):
-    if src.isupper():
-        return dst.upper()
-    if src.istitle():
-        return " ".join(w.capitalize() for w in dst.split())
-    return dst
+class FoldTable(dict):
+    def __missing__(self, cp):
+        v = self[cp] = fold_char(cp)
+        return v
+
+FOLD = FoldTable((cp, fold_char(cp)) for cp in range(ord("A"), 0x370) if not 0x5B <= cp < 0x80)
+UNALIGNED = re.compile("[" + "".join(re.escape(chr(cp)) for cp, v in FOLD.items() if isinstance(v, str)) + "\u0370-\U0010ffff]")
+
+def is_aligned(text):
+    return text.isascii() or not UNALIGNED.search(text)
 
 def is_plural_pt(word):
     b = normalize(word)
@@ -89,16 +100,17 @@ def depluralize_pt(word):
         return b[:-1]
     return b
 
-def pluralize_en(word):
+def pluralize_en(word, uncountable=None):
     w = word
-    if w in UNCOUNTABLE_EN:
+    if w in (UNCOUNTABLE_EN if uncountable is None else uncountable):
         return w
+    for sg, pl in IRREGULAR_EN.items():
+        if w.endswith(sg):
+            return w[:-len(sg)] + pl
     if re.search(r"(s|x|z|ch|sh)$", w):
         return w + "es"
     if re.search(r"[^aeiou]y$", w):
         return w[:-1] + "ies"
-    if w.endswith("potato"):
-        return "potatoes"
     return w + "s"
 
 def depluralize_en(word):
@@ -111,76 +123,866 @@ def depluralize_en(word):
         return w[:-1]
     return w
 
-def replace_phrases(text, mapping_norm):
-    items = sorted(mapping_norm.items(), key=lambda kv: -len(kv[0]))
-    pattern = re.compile(r"\b[\wÀ-ÖØ-öø-ÿ]+(?:\s+[\wÀ-ÖØ-öø-ÿ]+)+\b", flags=re.UNICODE)
-    out = text
-    for norm_src, dst in items:
-        if normalize(out) == norm_src:
-            return match_casing(out, dst)
-        def repl(m):
-            span = m.group(0)
-            if normalize(span) == norm_src:
-                return match_casing(span, dst)
-            return span
-        out = pattern.sub(repl, out)
+def pluralize_pt(word):
+    if word in IRREGULAR_PT:
+        return IRREGULAR_PT[word]
+    if word.endswith(("s", "x")):
+        return word
+    for sg, pl in PT_PLURAL_SUFFIXES:
+        if word.endswith(sg):
+            return word[:-len(sg)] + pl
+    return word + "s"
+
+def plural_forms_pt(word):
+    b = normalize(word)
+    forms = {b + "s", normalize(pluralize_pt(word))}
+    if b.endswith("ao"):
+        forms.update(b[:-2] + p for p in PT_AO_PLURALS)
+    forms.discard(b)
+    return forms
+
+def plural_forms_en(word):
+    forms = {word + "s", pluralize_en(word, ())}
+    forms.discard(word)
+    return forms
+
+def takes_plural(cands):
+    return cands[0].number != "pl" and cands[0].pos in PLURAL_POS
+
+def plural_en_of(cands, uncountable_en):
+    if cands[0].pos == "adj":
+        return cands[0].en
+    return pluralize_en(cands[0].en, uncountable_en)
+
+def takes_plural_en(cands):
+    return takes_plural(cands) and cands[0].pos != "adj"
+
+def plural_pt_of(cands, uncountable_pt):
+    pl = next((c.pt for c in cands if c.number == "pl"), None)
+    if pl is None:
+        pt = cands[0].pt
+        pl = pt if normalize(pt) in uncountable_pt or " " in pt else pluralize_pt(pt)
+    return pl
+
+def build_plurals(words, uncountable_en, uncountable_pt):
+    uncountable_pt = {normalize(w) for w in uncountable_pt}
+    singular_pt = [(k, c) for k, c in words.pt.items() if takes_plural(c)]
+    singular_en = [(k, c) for k, c in words.en.items() if takes_plural_en(c)]
+    pt_en = {}
+    for k, cands in singular_pt:
+        pt_en.setdefault(k + "s", plural_en_of(cands, uncountable_en))
+    for k, cands in singular_pt:
+        for form in plural_forms_pt(cands[0].pt):
+            pt_en.setdefault(form, plural_en_of(cands, uncountable_en))
+    en_pt = {}
+    for k, cands in singular_en:
+        pl = plural_pt_of(cands, uncountable_pt)
+        for form in plural_forms_en(k):
+            en_pt.setdefault(form, pl)
+    return (
+        {form: v for form, v in pt_en.items() if form not in words.pt},
+        {form: v for form, v in en_pt.items() if form not in words.en},
+    )
+
+def trigrams(word):
+    w = " " + word + " "
+    return [w[i:i + 3] for i in range(len(w) - 2)]
+
+def count_trigrams(lines):
+    counts = {}
+    for line in lines:
+        for word in normalize(line).split():
+            for t in trigrams(word):
+                counts[t] = counts.get(t, 0) + 1
+    return counts
+
+def build_trigrams(pt_lines, en_lines, alpha=TRIGRAM_SMOOTHING):
+    pt = count_trigrams(pt_lines)
+    en = count_trigrams(en_lines)
+    vocab = sorted(set(pt) | set(en))
+    total_pt = sum(pt.values()) + alpha * len(vocab)
+    total_en = sum(en.values()) + alpha * len(vocab)
+    return {t: math.log((pt.get(t, 0) + alpha) / total_pt) - math.log((en.get(t, 0) + alpha) / total_en) for t in vocab}
+
+def word_language(norm, tables):
+    pt = norm in tables["NORM_PT_EN"] or norm in tables["PLURAL_PT_EN"]
+    en = norm in tables["NORM_EN_PT"] or norm in tables["PLURAL_EN_PT"]
+    return 0.0 if pt and en else 1.0 if pt else -1.0 if en else None
+
+def build_word_lang(tables):
+    keys = set(tables["NORM_PT_EN"]) | set(tables["PLURAL_PT_EN"]) | set(tables["NORM_EN_PT"]) | set(tables["PLURAL_EN_PT"])
+    return {k: word_language(k, tables) for k in sorted(keys)}
+
+def source_files(path=LEXICON_DIR):
+    files = {}
+    for name, base in LEXICON_SOURCES.items():
+        for ext in (".tsv", ".json"):
+            p = os.path.join(path, base + ext)
+            if os.path.exists(p):
+                files[name] = p
+                break
+    return files
+
+def read_source(p):
+    with open(p, encoding="utf-8") as fh:
+        if p.endswith(".json"):
+            return json.load(fh)
+        rows = []
+        for line in fh:
+            line = line.rstrip("\r\n")
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            rows.append([c.strip() for c in line.split("\t")])
+        return rows
+
+
+def make_entry(row):
+    tags = [t.strip() for t in row[2].split(",")] if len(row) > 2 and row[2] else []
+    pos = next((t for t in tags if t not in ("sg", "pl", "pref")), "")
+    number = "pl" if "pl" in tags else "sg" if "sg" in tags else ""
+    return Entry(row[0], row[1], pos, number, "pref" in tags)
+
+def load_sources(files):
+    sources = {}
+    for name, p in files.items():
+        data = read_source(p)
+        if name.startswith("UNCOUNTABLE_"):
+            sources[name] = {row[0] if isinstance(row, list) else row for row in data}
+        elif name.startswith("NGRAM_"):
+            sources[name] = [row[0] if isinstance(row, list) else row for row in data]
+        elif isinstance(data, dict):
+            sources[name] = [make_entry([k, v]) for k, v in data.items()]
+        else:
+            sources[name] = [make_entry(row) for row in data]
+    return sources
+
+class BiIndex:
+    def __init__(self, pt, en):
+        self.pt = pt
+        self.en = en
+
+    @classmethod
+    def build(cls, entries):
+        pt = {}
+        en = {}
+        for e in dict.fromkeys(entries):
+            pt.setdefault(normalize(e.pt), []).append(e)
+            en.setdefault(normalize(e.en), []).append(e)
+        for side in (pt, en):
+            for k, cands in side.items():
+                side[k] = tuple(sorted(cands, key=lambda e: not e.pref))
+        return cls(pt, en)
+
+    def pt_en(self, word):
+        return self.pt.get(normalize(word), ())
+
+    def en_pt(self, word):
+        return self.en.get(normalize(word), ())
+
+    def norm_pt_en(self):
+        return {k: cands[0].en for k, cands in self.pt.items()}
+
+    def norm_en_pt(self):
+        return {k: cands[0].pt for k, cands in self.en.items()}
+
+def build_lexicon(sources):
+    words = BiIndex.build(sources["PT_EN"])
+    phrases = BiIndex.build(sources["PHRASES_PT_EN"])
+    plural_pt_en, plural_en_pt = build_plurals(words, sources["UNCOUNTABLE_EN"], sources["UNCOUNTABLE_PT"])
+    tables = {
+        "PT_EN": {e.pt: e.en for e in reversed(sources["PT_EN"])},
+        "EN_PT": {cands[0].en: cands[0].pt for cands in words.en.values()},
+        "PHRASES_PT_EN": {e.pt: e.en for e in reversed(sources["PHRASES_PT_EN"])},
+        "PHRASES_EN_PT": {cands[0].en: cands[0].pt for cands in phrases.en.values()},
+        "UNCOUNTABLE_EN": set(sources["UNCOUNTABLE_EN"]),
+        "UNCOUNTABLE_PT": set(sources["UNCOUNTABLE_PT"]),
+        "WORDS": words,
+        "PHRASES": phrases,
+        "NORM_PT_EN": words.norm_pt_en(),
+        "NORM_EN_PT": words.norm_en_pt(),
+        "NORM_PH_PT_EN": phrases.norm_pt_en(),
+        "NORM_PH_EN_PT": phrases.norm_en_pt(),
+        "PLURAL_PT_EN": plural_pt_en,
+        "PLURAL_EN_PT": plural_en_pt,
+        "TRIGRAMS": build_trigrams(sources["NGRAM_PT"], sources["NGRAM_EN"]),
+    }
+    tables["WORD_LANG"] = build_word_lang(tables)
+    return tables
+
+def source_fingerprint(files):
+    out = {}
+    for name, p in files.items():
+        st = os.stat(p)
+        out[name] = [os.path.basename(p), st.st_size, st.st_mtime_ns]
     return out
 
+def source_digest(p):
+    with open(p, "rb") as fh:
+        return hashlib.sha256(fh.read()).digest()
+
+def source_version(files, digests=None):
+    h = hashlib.sha256()
+    for name in sorted(files):
+        h.update(name.encode("utf-8") + b"\0")
+        h.update(digests[name] if digests else source_digest(files[name]))
+    return h.hexdigest()[:16]
+
+def open_lexicon(path):
+    header, packed = open_compiled(path)
+    tables = dict(packed)
+    for name in ("UNCOUNTABLE_EN", "UNCOUNTABLE_PT"):
+        tables[name] = set(packed[name])
+    for name in ("WORDS", "PHRASES"):
+        tables[name] = BiIndex(packed[name + "_PT"], packed[name + "_EN"])
+    return header, tables
+
+def load_lexicon(path=LEXICON_DIR, shared=True):
+    if shared and SHARED_LEXICON:
+        try:
+            header, tables = open_lexicon(SHARED_LEXICON)
+        except (OSError, ValueError) as exc:
+            warnings.warn(f"Shared lexicon {SHARED_LEXICON} not available ({exc}); loading {path}")
+        else:
+            return header["version"], tables
+    files = source_files(path)
+    compiled = os.path.join(path, COMPILED_LEXICON)
+    if os.path.exists(compiled):
+        try:
+            header, tables = open_lexicon(compiled)
+        except ValueError as exc:
+            warnings.warn(f"{exc}; rebuilding from sources")
+        else:
+            if not files or header["sources"] == source_fingerprint(files):
+                return header["version"], tables
+            warnings.warn(f"{compiled} is stale; run: python menu_lexicon.py compile")
+    if len(files) != len(LEXICON_SOURCES):
+        missing = sorted(set(LEXICON_SOURCES) - set(files))
+        raise FileNotFoundError(f"Lexicon sources not found in {path}: {', '.join(missing)}")
+    return source_version(files), build_lexicon(load_sources(files))
+
+LEXICON_VERSION, LEXICON = load_lexicon()
+PT_EN = LEXICON["PT_EN"]
+EN_PT = LEXICON["EN_PT"]
+PHRASES_PT_EN = LEXICON["PHRASES_PT_EN"]
+PHRASES_EN_PT = LEXICON["PHRASES_EN_PT"]
+UNCOUNTABLE_EN = LEXICON["UNCOUNTABLE_EN"]
+UNCOUNTABLE_PT = LEXICON["UNCOUNTABLE_PT"]
+WORDS = LEXICON["WORDS"]
+PHRASES = LEXICON["PHRASES"]
+NORM_PT_EN = LEXICON["NORM_PT_EN"]
+NORM_EN_PT = LEXICON["NORM_EN_PT"]
+NORM_PH_PT_EN = LEXICON["NORM_PH_PT_EN"]
+NORM_PH_EN_PT = LEXICON["NORM_PH_EN_PT"]
+PLURAL_PT_EN = LEXICON["PLURAL_PT_EN"]
+PLURAL_EN_PT = LEXICON["PLURAL_EN_PT"]
+TRIGRAMS = LEXICON["TRIGRAMS"]
+WORD_LANG = LEXICON["WORD_LANG"]
+
+def install_lexicon(version, tables):
+    globals().update(tables, LEXICON_VERSION=version, LEXICON=tables)
+
+TOKEN = re.compile(r"\S+")
+
+Token = namedtuple("Token", "text norm start end casing")
+Line = namedtuple("Line", "text norm aligned tokens")
+SpanTranslation = namedtuple("SpanTranslation", "text spans")
+
+def tokenize(text):
+    aligned = is_aligned(text)
+    norm = normalize(text)
+    tokens = []
+    for m in TOKEN.finditer(text):
+        w = m.group()
+        s, e = m.span()
+        tokens.append(Token(w, norm[s:e] if aligned else normalize(w), s, e, casing_of(w)))
+    return Line(text, norm, aligned, tokens)
+
+class Casing(IntEnum):
+    LOWER = 0
+    UPPER = 1
+    TITLE = 2
+    MIXED = 3
+
+def casing_of(text):
+    if text.islower():
+        return Casing.LOWER
+    if text.isupper():
+        return Casing.UPPER
+    if text.istitle():
+        return Casing.TITLE
+    return Casing.MIXED if text[:1].isupper() else Casing.LOWER
+
+def recase(dst, casing):
+    if casing == Casing.UPPER:
+        return dst.upper()
+    if casing == Casing.TITLE:
+        return " ".join(w.capitalize() for w in dst.split())
+    if casing == Casing.MIXED:
+        return dst[:1].upper() + dst[1:]
+    return dst
+
+CASED_FORMS = tuple({} for _ in Casing)
+
+def cased(dst, casing):
+    if not casing:
+        return dst
+    forms = CASED_FORMS[casing]
+    form = forms.get(dst)
+    if form is None:
+        form = forms[dst] = recase(dst, casing)
+    return form
+
+def match_casing(src, dst):
+    return recase(dst, casing_of(src))
+
+PHRASE_SPAN = re.compile(r"\b[\wÀ-ÖØ-öø-ÿ]+(?:\s+[\wÀ-ÖØ-öø-ÿ]+)+\b", flags=re.UNICODE)
+WORD_SPAN = re.compile(r"[\wÀ-ÖØ-öø-ÿ](?:\S*[\wÀ-ÖØ-öø-ÿ])?")
+
+def match_phrases(line, mapping_norm):
+    text = line.text
+    dst = mapping_norm.get(line.norm)
+    if dst is not None:
+        return [(0, len(text), cased(dst, casing_of(text)))]
+    found = []
+    for m in PHRASE_SPAN.finditer(text):
+        s, e = m.span()
+        span = m.group()
+        dst = mapping_norm.get(line.norm[s:e] if line.aligned else normalize(span))
+        if dst is not None:
+            found.append((s, e, cased(dst, casing_of(span))))
+    return found
+
+def replace_phrases(text, mapping_norm):
+    out = []
+    pos = 0
+    for s, e, dst in match_phrases(tokenize(text), mapping_norm):
+        out.append(text[pos:s])
+        out.append(dst)
+        pos = e
+    out.append(text[pos:])
+    return "".join(out)
+
+def phrase_units(line, mapping_norm, found=None):
+    tokens = line.tokens
+    if found is None:
+        found = match_phrases(line, mapping_norm)
+    if not found:
+        return tokens
+    units = []
+    phrases = iter(found)
+    ph = next(phrases, None)
+    k = 0
+    while k < len(tokens):
+        tok = tokens[k]
+        if ph is None or tok.end <= ph[0]:
+            units.append(tok)
+            k += 1
+            continue
+        parts = []
+        pos = tok.start
+        end = tok.end
+        while ph is not None and ph[0] < end:
+            s, e, dst = ph
+            parts.append(line.text[pos:s])
+            parts.append(dst)
+            pos = e
+            while k + 1 < len(tokens) and tokens[k].end < e:
+                k += 1
+            end = tokens[k].end
+            ph = next(phrases, None)
+        parts.append(line.text[pos:end])
+        units.extend(split_units(parts))
+        k += 1
+    return units
+
+def split_units(parts):
+    # parts alternate source text and replaced phrases; replaced words are final,
+    # words glued to source text are looked up again like any other token
+    pieces = []
+    glued = False
+    for i, part in enumerate(parts):
+        words = part.split()
+        if not words:
+            glued = glued and not part
+            continue
+        if glued and not part[0].isspace():
+            pieces[-1] = [pieces[-1][0] + words[0], False]
+            words = words[1:]
+        pieces.extend([w, i % 2 == 1] for w in words)
+        glued = not part[-1].isspace()
+    return [w if final else Token(w, normalize(w), None, None, casing_of(w)) for w, final in pieces]
+
+def edit_distance(a, b, limit):
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    j = 0
+    while j < n - i and a[-1 - j] == b[-1 - j]:
+        j += 1
+    a = a[i:len(a) - j]
+    b = b[i:len(b) - j]
+    if not a or not b:
+        return min(max(len(a), len(b)), limit + 1)
+    before = None
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] * (len(b) + 1)
+        for j, cb in enumerate(b, 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if j > 1 and i > 1 and ca == b[j - 2] and cb == a[i - 2]:
+                d = min(d, before[j - 2] + 1)
+            cur[j] = d
+        if min(cur) > limit:
+            return limit + 1
+        before, prev = prev, cur
+    return min(prev[-1], limit + 1)
+
+def deletes(word, distance):
+    found = {word}
+    level = found
+    for _ in range(distance):
+        level = {w[:i] + w[i + 1:] for w in level for i in range(len(w))}
+        found |= level
+    return found
+
+class DeletionIndex:
+    def __init__(self, keys, distance=1, prefix=FUZZY_PREFIX):
+        self.distance = distance
+        self.prefix = prefix
+        index = {}
+        for key in keys:
+            for d in deletes(key[:prefix], distance):
+                index.setdefault(d, []).append(key)
+        self.index = index
+
+    def lookup(self, word):
+        best = None
+        limit = self.distance
+        seen = set()
+        get = self.index.get
+        for d in deletes(word[:self.prefix], self.distance):
+            for key in get(d, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                dist = edit_distance(word, key, limit)
+                if dist <= limit and (best is None or (dist, key) < best):
+                    best = dist, key
+                    limit = dist
+        return None if best is None else best[1]
+
+def fuzzy_keys(words, plurals):
+    return sorted({k for t in (words, plurals) for k in t if len(k) >= FUZZY_MIN_LENGTH and k.isalpha()})
+
+def fuzzy_index(direction):
+    if direction == "pt_en":
+        words, plurals = NORM_PT_EN, PLURAL_PT_EN
+    else:
+        words, plurals = NORM_EN_PT, PLURAL_EN_PT
+    entry = FUZZY_INDEXES.get(direction)
+    if entry is None or entry[0] is not words or entry[1] is not plurals or entry[2].distance != FUZZY_DISTANCE:
+        entry = FUZZY_INDEXES[direction] = words, plurals, DeletionIndex(fuzzy_keys(words, plurals), FUZZY_DISTANCE)
+    return entry
+
+def fuzzy_lookup(norm, direction):
+    return fuzzy_correct(norm, *fuzzy_index(direction))
+
+def fuzzy_correct(norm, words, plurals, index):
+    if len(norm) < FUZZY_MIN_LENGTH or not norm.isalpha():
+        return None
+    key = index.lookup(norm)
+    if key is None:
+        return None
+    tr = words.get(key)
+    return plurals.get(key) if tr is None else tr
+
+def translate_token_pt_en(tok):
+    tr = NORM_PT_EN.get(tok.norm)
+    if tr is None:
+        tr = PLURAL_PT_EN.get(tok.norm)
+        if tr is None and FUZZY_DISTANCE:
+            tr = fuzzy_lookup(tok.norm, "pt_en")
+    return cased(tr, tok.casing) if tr else tok.text
+
+def translate_token_en_pt(tok):
+    tr = NORM_EN_PT.get(tok.norm)
+    if tr is None:
+        tr = PLURAL_EN_PT.get(tok.norm)
+        if tr is None and FUZZY_DISTANCE:
+            tr = fuzzy_lookup(tok.norm, "en_pt")
+    return cased(tr, tok.casing) if tr else tok.text
+
+def translate_units(units, translate_token):
+    return " ".join(u if isinstance(u, str) else translate_token(u) for u in units)
+
 def translate_tokens_pt_en(text):
-    words = [w for w in text.split() if w]
-    result = []
-    for w in words:
-        base = normalize(w)
-        tr = NORM_PT_EN.get(base)
-        if tr is None and is_plural_pt(w):
-            singular_base = depluralize_pt(w)
-            tr_sing = NORM_PT_EN.get(singular_base)
-            if tr_sing:
-                tr = pluralize_en(tr_sing)
-        result.append(match_casing(w, tr if tr else w))
-    return " ".join(result)
+    return translate_units(tokenize(text).tokens, translate_token_pt_en)
 
 def translate_tokens_en_pt(text):
-    words = [w for w in text.split() if w]
-    result = []
-    for w in words:
-        base = normalize(w)
-        tr = NORM_EN_PT.get(base)
-        if tr is None:
-            singular_base = depluralize_en(w)
-            tr_sing = NORM_EN_PT.get(singular_base)
-            if tr_sing:
-                tr = tr_sing  # keep simple singular PT at this level
-        result.append(match_casing(w, tr if tr else w))
-    return " ".join(result)
+    return translate_units(tokenize(text).tokens, translate_token_en_pt)
+
+def trigram_score(norm, trigrams=None):
+    w = " " + norm + " "
+    get = (TRIGRAMS if trigrams is None else trigrams).get
+    s = 0.0
+    for i in range(len(w) - 2):
+        s += get(w[i:i + 3], 0.0)
+    s *= DETECT_TRIGRAM_SCALE
+    return -DETECT_TRIGRAM_CAP if s < -DETECT_TRIGRAM_CAP else DETECT_TRIGRAM_CAP if s > DETECT_TRIGRAM_CAP else s
+
+class WordVotes(dict):
+    def __init__(self, word_lang, trigrams):
+        super().__init__()
+        self.word_lang = word_lang
+        self.trigrams = trigrams
+
+    def __missing__(self, norm):
+        vote = self.word_lang.get(norm)
+        if vote is None:
+            vote = trigram_score(norm, self.trigrams)
+        if len(self) >= WORD_VOTE_MEMO_SIZE:
+            self.clear()
+        self[norm] = vote
+        return vote
+
+def word_votes():
+    global VOTES
+    votes = VOTES
+    if votes is None or votes.word_lang is not WORD_LANG or votes.trigrams is not TRIGRAMS:
+        votes = VOTES = WordVotes(WORD_LANG, TRIGRAMS)
+    return votes
+
+def score_line(line, phrases_pt, phrases_en, votes):
+    score = 0.0
+    if line.norm in phrases_pt:
+        score += DETECT_PHRASE_WEIGHT
+    if line.norm in phrases_en:
+        score -= DETECT_PHRASE_WEIGHT
+    left = len(line.tokens)
+    for tok in line.tokens:
+        left -= 1
+        score += votes[tok.norm]
+        if score > left or score < -left:
+            break
+    return score
+
+def direction_score(line):
+    return score_line(line, NORM_PH_PT_EN, NORM_PH_EN_PT, word_votes())
+
+def detect_language(text):
+    return detect_language_line(tokenize(text))
+
+def detect_language_line(line):
+    score = direction_score(line)
+    confidence = 1.0 / (1.0 + math.exp(-DETECT_CONFIDENCE_SLOPE * abs(score)))
+    return ("en_pt" if score < 0 else "pt_en"), confidence
 
 def detect_direction(text):
-    tokens = [w for w in text.split() if w]
-    if not tokens:
+    return detect_direction_line(tokenize(text))
+
+def detect_direction_line(line):
+    return "en_pt" if direction_score(line) < 0 else "pt_en"
+
+def detect_direction_counts(line):
+    if not line.tokens:
         return "pt_en"
     score_pt = 0
     score_en = 0
-    norm_line = normalize(text)
-    if norm_line in NORM_PH_PT_EN:
+    if line.norm in NORM_PH_PT_EN:
         score_pt += 3
-    if norm_line in NORM_PH_EN_PT:
+    if line.norm in NORM_PH_EN_PT:
         score_en += 3
-    for w in tokens:
-        b = normalize(w)
-        if b in NORM_PT_EN:
+    for tok in line.tokens:
+        if tok.norm in NORM_PT_EN or tok.norm in PLURAL_PT_EN:
             score_pt += 1
-        if b in NORM_EN_PT:
+        if tok.norm in NORM_EN_PT or tok.norm in PLURAL_EN_PT:
             score_en += 1
     return "en_pt" if score_en > score_pt else "pt_en"
 
+def detect_document(items, sample_size=DOC_SAMPLE_SIZE):
+    step = max(1, len(items) // max(1, sample_size))
+    pt = en = 0.0
+    for item in items[::step][:sample_size]:
+        score = direction_score(tokenize(item))
+        if score > 0:
+            pt += score
+        else:
+            en -= score
+    if not pt + en:
+        return "pt_en", 0.5
+    return ("en_pt" if en > pt else "pt_en"), max(pt, en) / (pt + en)
+
+def disagrees(line, direction):
+    if line.norm in (NORM_PH_EN_PT if direction == "pt_en" else NORM_PH_PT_EN):
+        return True
+    get = WORD_LANG.get
+    other = -1.0 if direction == "pt_en" else 1.0
+    return any(get(tok.norm) == other for tok in line.tokens)
+
+def line_direction(line, direction=None):
+    if direction is None or disagrees(line, direction):
+        return detect_direction_line(line)
+    return direction
+
 def translate_item_auto(item):
-    direction = detect_direction(item)
+    if PROFILE is not None:
+        return translate_item_profiled(item, PROFILE)
+    line = tokenize(item)
+    if detect_direction_line(line) == "pt_en":
+        return translate_units(phrase_units(line, NORM_PH_PT_EN), translate_token_pt_en)
+    else:
+        return translate_units(phrase_units(line, NORM_PH_EN_PT), translate_token_en_pt)
+
+def translate_item_profiled(item, profile, direction=None):
+    times = profile.times
+    counts = profile.counts
+    clock = time.perf_counter_ns
+    t0 = clock()
+    line = tokenize(item)
+    t1 = clock()
+    direction = line_direction(line, direction)
+    t2 = clock()
     if direction == "pt_en":
-        pre = replace_phrases(item, NORM_PH_PT_EN)
-        return translate_tokens_pt_en(pre)
+        phrases, words, plurals = NORM_PH_PT_EN, NORM_PT_EN, PLURAL_PT_EN
     else:
-        pre = replace_phrases(item, NORM_PH_EN_PT)
-        return translate_tokens_en_pt(pre)
+        phrases, words, plurals = NORM_PH_EN_PT, NORM_EN_PT, PLURAL_EN_PT
+    found = match_phrases(line, phrases)
+    units = phrase_units(line, phrases, found)
+    t3 = clock()
+    lookup = plural = fuzzy = casing = 0
+    hits = misses = fallbacks = corrections = 0
+    out = []
+    for u in units:
+        if isinstance(u, str):
+            out.append(u)
+            continue
+        a = clock()
+        tr = words.get(u.norm)
+        b = clock()
+        lookup += b - a
+        if tr is None:
+            tr = plurals.get(u.norm)
+            a = clock()
+            plural += a - b
+            b = a
+            if tr is not None:
+                fallbacks += 1
+            elif FUZZY_DISTANCE:
+                tr = fuzzy_lookup(u.norm, direction)
+                a = clock()
+                fuzzy += a - b
+                b = a
+                if tr is None:
+                    misses += 1
+                else:
+                    corrections += 1
+            else:
+                misses += 1
+        else:
+            hits += 1
+        out.append(cased(tr, u.casing) if tr else u.text)
+        casing += clock() - b
+    t4 = clock()
+    result = " ".join(out)
+    t5 = clock()
+    for stage, ns in (("tokenize", t1 - t0), ("detect", t2 - t1), ("phrases", t3 - t2), ("lookup", lookup),
+                      ("plurals", plural), ("fuzzy", fuzzy), ("casing", casing), ("join", t5 - t4), ("total", t5 - t0)):
+        times[stage] = times.get(stage, 0) + ns
+    for name, n in (("items", 1), ("items_" + direction, 1), ("phrase_hits", len(found)),
+                    ("lexicon_hits", hits), ("lexicon_misses", misses), ("plural_fallbacks", fallbacks),
+                    ("fuzzy_corrections", corrections)):
+        counts[name] = counts.get(name, 0) + n
+    return result
+
+def translate_item_directed(item, direction=None):
+    if PROFILE is not None:
+        return translate_item_profiled(item, PROFILE, direction)
+    line = tokenize(item)
+    if line_direction(line, direction) == "pt_en":
+        return translate_units(phrase_units(line, NORM_PH_PT_EN), translate_token_pt_en)
+    return translate_units(phrase_units(line, NORM_PH_EN_PT), translate_token_en_pt)
+
+def casing_key(item):
+    casing = casing_of(item)
+    if casing != Casing.UPPER and casing != Casing.TITLE:
+        return item, False
+    folded = item.lower()
+    if recase(folded, casing) != item:
+        return item, False
+    if casing == Casing.TITLE and any(w.isupper() for w in item.split()):
+        return item, False
+    return folded, True
+
+def translate_batch(items, direction=None):
+    keys = {}
+    slots = []
+    for item in items:
+        key, folded = casing_key(item)
+        slots.append((keys.setdefault(key, len(keys)), folded))
+    lines = [tokenize(k) for k in keys]
+    directions = [line_direction(line, direction) for line in lines]
+    units = [phrase_units(line, NORM_PH_PT_EN if d == "pt_en" else NORM_PH_EN_PT)
+             for line, d in zip(lines, directions)]
+    words = {"pt_en": {}, "en_pt": {}}
+    for line_units, d in zip(units, directions):
+        seen = words[d]
+        for u in line_units:
+            if not isinstance(u, str) and u.text not in seen:
+                seen[u.text] = u
+    for d, translate_token in (("pt_en", translate_token_pt_en), ("en_pt", translate_token_en_pt)):
+        seen = words[d]
+        for text, tok in seen.items():
+            seen[text] = translate_token(tok)
+    out = [" ".join(u if isinstance(u, str) else words[d][u.text] for u in line_units)
+           for line_units, d in zip(units, directions)]
+    return [match_casing(item, out[k]) if folded else out[k] for item, (k, folded) in zip(items, slots)]
+
+def translate_document(items, sample_size=DOC_SAMPLE_SIZE, threshold=DOC_CONFIDENCE):
+    direction, confidence = detect_document(items, sample_size)
+    return translate_batch(items, direction if confidence >= threshold else None)
+
+def translate_spans(item, direction=None):
+    line = tokenize(item)
+    direction = line_direction(line, direction)
+    if direction == "pt_en":
+        phrases, words, plurals = NORM_PH_PT_EN, NORM_PT_EN, PLURAL_PT_EN
+    else:
+        phrases, words, plurals = NORM_PH_EN_PT, NORM_EN_PT, PLURAL_EN_PT
+    text = line.text
+    found = iter(match_phrases(line, phrases))
+    ph = next(found, None)
+    matches = []
+    for tok in line.tokens:
+        m = WORD_SPAN.search(tok.text)
+        if m is None:
+            continue
+        s, e = tok.start + m.start(), tok.start + m.end()
+        while ph is not None and ph[1] <= s:
+            matches.append(ph)
+            ph = next(found, None)
+        if ph is not None and ph[0] < e:
+            continue
+        norm = line.norm[s:e] if line.aligned else normalize(m.group())
+        tr = words.get(norm)
+        if tr is None:
+            tr = plurals.get(norm)
+            if tr is None and FUZZY_DISTANCE:
+                tr = fuzzy_lookup(norm, direction)
+        if tr:
+            matches.append((s, e, cased(tr, casing_of(m.group()))))
+    if ph is not None:
+        matches.append(ph)
+        matches.extend(found)
+    pieces = []
+    spans = []
+    pos = 0
+    size = 0
+    for s, e, dst in matches:
+        pieces.append(text[pos:s])
+        pieces.append(dst)
+        size += s - pos
+        spans.append((s, e, size, size + len(dst)))
+        size += len(dst)
+        pos = e
+    pieces.append(text[pos:])
+    return SpanTranslation("".join(pieces), spans)
+
+def current_tables():
+    return {name: globals()[name] for name in TRANSLATOR_TABLES}
+
+class Translator:
+    def __init__(self, tables, direction, fuzzy=None):
+        if direction == "pt_en":
+            names = ("NORM_PH_PT_EN", "NORM_PT_EN", "PLURAL_PT_EN")
+        elif direction == "en_pt":
+            names = ("NORM_PH_EN_PT", "NORM_EN_PT", "PLURAL_EN_PT")
+        else:
+            raise ValueError(f"unknown direction: {direction!r}")
+        self.direction = direction
+        self.phrases, self.words, self.plurals = (tables[name] for name in names)
+        distance = FUZZY_DISTANCE if fuzzy is None else fuzzy
+        self.fuzzy = DeletionIndex(fuzzy_keys(self.words, self.plurals), distance) if distance else None
+        self.translate_token = self.compile_token()
+        self.translate_line = self.compile_line()
+
+    def __call__(self, item):
+        return self.translate_line(tokenize(item))
+
+    def compile_token(self):
+        words, plurals, fuzzy = self.words, self.plurals, self.fuzzy
+        words_get, plurals_get, correct, apply_casing = words.get, plurals.get, fuzzy_correct, recase
+        forms = tuple({} for _ in Casing)
+
+        def translate_token(tok):
+            norm = tok.norm
+            tr = words_get(norm)
+            if tr is None:
+                tr = plurals_get(norm)
+                if tr is None and fuzzy is not None:
+                    tr = correct(norm, words, plurals, fuzzy)
+            if not tr:
+                return tok.text
+            casing = tok.casing
+            if not casing:
+                return tr
+            form = forms[casing].get(tr)
+            if form is None:
+                form = forms[casing][tr] = apply_casing(tr, casing)
+            return form
+        return translate_token
+
+    def compile_line(self):
+        phrases, translate_token = self.phrases, self.translate_token
+        match, units_of, join, is_text = match_phrases, phrase_units, " ".join, isinstance
+
+        def translate_line(line):
+            found = match(line, phrases)
+            units = units_of(line, phrases, found) if found else line.tokens
+            return join([u if is_text(u, str) else translate_token(u) for u in units])
+        return translate_line
+
+class AutoTranslator:
+    def __init__(self, tables=None, fuzzy=None, version=None):
+        if tables is None:
+            tables, version = current_tables(), LEXICON_VERSION
+        self.tables = tables
+        self.version = version
+        self.pt_en = Translator(tables, "pt_en", fuzzy)
+        self.en_pt = Translator(tables, "en_pt", fuzzy)
+        self.score = self.compile_score()
+        self.translate = self.compile()
+
+    @classmethod
+    def load(cls, path, fuzzy=None):
+        version, tables = load_lexicon(path, shared=False)
+        return cls(tables, fuzzy, version)
+
+    def __call__(self, item):
+        return self.translate(item)
+
+    def detect(self, item):
+        return "en_pt" if self.score(tokenize(item)) < 0 else "pt_en"
+
+    def compile_score(self):
+        tables = self.tables
+        ph_pt, ph_en = tables["NORM_PH_PT_EN"], tables["NORM_PH_EN_PT"]
+        votes = WordVotes(tables["WORD_LANG"], tables["TRIGRAMS"])
+
+        def score(line):
+            return score_line(line, ph_pt, ph_en, votes)
+        return score
+
+    def compile(self):
+        score, tok = self.score, tokenize
+        pt, en = self.pt_en.translate_line, self.en_pt.translate_line
+
+        def translate(item):
+            line = tok(item)
+            return en(line) if score(line) < 0 else pt(line)
+        return translate
 
 def clean_tail_punct(s):
     return re.sub(r"[,\s\.]+$", "", s).strip()
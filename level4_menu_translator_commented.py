@@ -1,90 +1,112 @@
 # level4_menu_translator_commented.py
+import hashlib  # Lexicon version hash
+import json  # JSON lexicon sources
+import math  # Log-probabilities for the language detector
+import os  # Lexicon file paths
 import re  # Import regex for phrase scanning and punctuation cleanup
+import time  # Per-stage timings (opt-in profiling)
 import unicodedata  # Import for accent removal and lowercase normalization
+import warnings  # Warn when the compiled lexicon is stale
+from collections import namedtuple  # Compact token records (tuples: no per-instance dict)
+from enum import IntEnum  # Casing classes
 
-# Single-word Portuguese → English glossary (includes some plural entries)
-PT_EN = {
-    "cardápio": "menu",
-    "menu": "menu",
-    "entrada": "starter",
-    "entradas": "starters",
-    "principal": "main",
-    "sobremesa": "dessert",
-    "bebida": "drink",
-    "bebidas": "drinks",
-    "água": "water",
-    "suco": "juice",
-    "refrigerante": "soda",
-    "cerveja": "beer",
-    "vinho": "wine",
-    "café": "coffee",
-    "chá": "tea",
-    "pão": "bread",
-    "manteiga": "butter",
-    "queijo": "cheese",
-    "frango": "chicken",
-    "carne": "beef",
-    "porco": "pork",
-    "peixe": "fish",
-    "peixes": "fish",  # fish is uncountable in EN; keep "fish"
-    "salada": "salad",
-    "sopa": "soup",
-    "massa": "pasta",
-    "molho": "sauce",
-    "tomate": "tomato",
-    "batata": "potato",
-    "batatas": "potatoes",  # irregular EN plural
-    "arroz": "rice",
-    "feijão": "beans",   # map singular PT to EN plural (common on menus)
-    "feijões": "beans",
-    "com": "with",
-    "sem": "without",
-    "e": "and",
-    "de": "of",
-}
+from menu_storage import Entry, open_compiled  # Glossary rows and the compiled lexicon reader
 
-# Auto-derive EN → PT single-word mapping
-EN_PT = {v: k for k, v in PT_EN.items()}  # Reverse dictionary
-
-# Phrase maps (bidirectional) with common plural variations
-PHRASES_PT_EN = {
-    "prato principal": "main course",
-    "água com gás": "sparkling water",
-    "agua com gas": "sparkling water",
-    "águas com gás": "sparkling water",
-    "aguas com gas": "sparkling water",
-    "água sem gás": "still water",
-    "agua sem gas": "still water",
-    "batata frita": "french fries",
-    "batatas fritas": "french fries",
-    "molho de tomate": "tomato sauce",
-    "arroz e feijão": "rice and beans",
-    "arroz e feijao": "rice and beans",
-}
-PHRASES_EN_PT = {v: k for k, v in PHRASES_PT_EN.items()}  # Reverse phrase dictionary
+# --- Lexicon files ---
+# The glossaries live in lexicon/ as TSV (or JSON) files that can be edited
+# without touching code. "python menu_lexicon.py compile" turns them into
+# lexicon.bin, which is mapped into memory at startup instead of rebuilding dicts.
 
-# Sets of uncountable nouns for simple plural logic
-UNCOUNTABLE_EN = {"rice", "fish", "water", "coffee", "tea", "bread"}
-UNCOUNTABLE_PT = {"arroz", "peixe", "água", "agua", "café", "cha", "chá", "pão"}
+LEXICON_DIR = os.environ.get("MENU_LEXICON_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicon")
+LEXICON_SOURCES = {  # Table name → source file name (without .tsv/.json)
+    "PT_EN": "pt_en",  # Single-word Portuguese → English glossary
+    "PHRASES_PT_EN": "phrases_pt_en",  # Phrase map with common plural variations
+    "UNCOUNTABLE_EN": "uncountable_en",  # Uncountable nouns for simple plural logic
+    "UNCOUNTABLE_PT": "uncountable_pt",
+    "NGRAM_PT": "ngrams_pt",  # Sample PT menu text for the detector's trigram model
+    "NGRAM_EN": "ngrams_en",  # Sample EN menu text
+}
+SHARED_LEXICON = os.environ.get("MENU_LEXICON_SHARED")  # Lexicon image shared by a parent process (see menu_lexicon.share_lexicon)
+COMPILED_LEXICON = "lexicon.bin"  # Compiled lexicon file name
+IRREGULAR_EN = {  # English plurals the suffix rules get wrong (matched at the end of a word)
+    "potato": "potatoes",
+    "tomato": "tomatoes",
+    "mango": "mangoes",
+    "leaf": "leaves",
+    "loaf": "loaves",
+    "half": "halves",
+    "knife": "knives",
+    "child": "children",
+}
+IRREGULAR_PT = {  # -ão nouns whose plural is not -ões
+    "pão": "pães",
+    "alemão": "alemães",
+    "capitão": "capitães",
+    "cão": "cães",
+    "mão": "mãos",
+    "irmão": "irmãos",
+    "grão": "grãos",
+    "cidadão": "cidadãos",
+}
+PT_PLURAL_SUFFIXES = (  # Singular ending → plural ending, first match wins
+    ("ão", "ões"), ("al", "ais"), ("el", "éis"), ("ol", "óis"), ("ul", "uis"),
+    ("il", "is"), ("m", "ns"), ("r", "res"), ("z", "zes"),
+)
+PT_AO_PLURALS = ("oes", "aes", "aos")  # Normalized plurals accepted for any -ão word
+PLURAL_POS = ("", "noun", "adj")  # Parts of speech that take a plural (untagged rows included)
+TRIGRAM_SMOOTHING = 0.5  # Add-alpha smoothing of the trigram counts
+DETECT_PHRASE_WEIGHT = 3.0  # Whole line is a known phrase (a known word counts 1)
+DETECT_TRIGRAM_SCALE = 0.25  # Trigram log-odds → score of an unknown word...
+DETECT_TRIGRAM_CAP = 0.9  # ...capped below a dictionary hit
+DETECT_CONFIDENCE_SLOPE = 1.5  # Score → confidence (logistic)
+DOC_SAMPLE_SIZE = 200  # Items scored to detect the language of a whole menu
+DOC_CONFIDENCE = 0.8  # Below this, every item is detected on its own
+FUZZY_DISTANCE = 0  # Max edits when correcting a misspelled word (0 = off)
+FUZZY_MIN_LENGTH = 4  # Shorter words are never corrected
+FUZZY_PREFIX = 7  # Letters of each word indexed for fuzzy matching
+WORD_VOTE_MEMO_SIZE = 100000  # Words whose language vote is memoized, per table set
+TRANSLATOR_TABLES = ("NORM_PT_EN", "NORM_EN_PT", "NORM_PH_PT_EN", "NORM_PH_EN_PT", "PLURAL_PT_EN", "PLURAL_EN_PT", "TRIGRAMS", "WORD_LANG")  # Tables bound by a compiled Translator
+PROFILE = None  # Stage timings and counters, see menu_profile.py (None = off)
+FUZZY_INDEXES = {}  # direction → (words, plurals, DeletionIndex) built from those tables
+VOTES = None  # WordVotes for the installed WORD_LANG / TRIGRAMS, see word_votes
 
 # Function to normalize strings (lowercase + remove accents)
 def normalize(s):
+    if s.isascii():  # Most English input: nothing to strip
+        return s.lower()
+    if "Σ" in s:  # Greek capital sigma lowercases differently at the end of a word
+        return normalize_nfkd(s)
+    return s.translate(FOLD)  # One table lookup per character
+
+# Reference normalization (lowercase + NFKD + drop combining marks)
+def normalize_nfkd(s):
     nfkd = unicodedata.normalize("NFKD", s.lower())  # Decompose accents
     return "".join(c for c in nfkd if not unicodedata.combining(c))  # Strip accents
 
-# Build normalized lookups
-NORM_PT_EN = {normalize(k): v for k, v in PT_EN.items()}  # Normalized PT→EN
-NORM_EN_PT = {normalize(k): v for k, v in EN_PT.items()}  # Normalized EN→PT
-NORM_PH_PT_EN = {normalize(k): v for k, v in PHRASES_PT_EN.items()}  # Normalized phrases PT→EN
-NORM_PH_EN_PT = {normalize(k): v for k, v in PHRASES_EN_PT.items()}  # Normalized phrases EN→PT
+# normalize_nfkd of a single character (as a code point when it is one character)
+def fold_char(cp):
+    v = normalize_nfkd(chr(cp))
+    return ord(v) if len(v) == 1 else v
 
-# Function to mirror capitalization from source to destination
-def match_casing(src, dst):
-    if src.isupper():  # ALL CAPS → ALL CAPS
-        return dst.upper()
-    if src.istitle():  # Title Case → Title Case
-        return " ".join(w.capitalize() for w in dst.split())
-    return dst  # Keep as-is (lower/mixed)
+# Accent-folding table for str.translate. Apart from the final-sigma rule of
+# lower(), normalize_nfkd works character by character, so folding each character
+# on its own gives exactly the same result. Characters outside the precomputed
+# range are folded with full NFKD the first time they are seen and remembered.
+class FoldTable(dict):
+    def __missing__(self, cp):
+        v = self[cp] = fold_char(cp)
+        return v
+
+# Precomputed for uppercase ASCII and everything up to U+036F
+# (Latin-1, Latin Extended-A/B, IPA, spacing modifiers, combining diacritics)
+FOLD = FoldTable((cp, fold_char(cp)) for cp in range(ord("A"), 0x370) if not 0x5B <= cp < 0x80)
+# Characters that may not fold to exactly one character (e.g. combining marks, "ĳ", non-Latin scripts)
+UNALIGNED = re.compile("[" + "".join(re.escape(chr(cp)) for cp, v in FOLD.items() if isinstance(v, str)) + "\u0370-\U0010ffff]")
+
+# True when normalize(text) has one character per input character,
+# so offsets in the normalized text match offsets in the original
+def is_aligned(text):
+    return text.isascii() or not UNALIGNED.search(text)
 
 # --- Basic plural helpers (Level 4: simple, not full morphology) ---
 
@@ -100,23 +122,24 @@ def depluralize_pt(word):
         return b[:-1]
     return b
 
-def pluralize_en(word):
+def pluralize_en(word, uncountable=None):
     """
     Naive EN plural:
+    - irregulars from IRREGULAR_EN ('potato' → 'potatoes', 'leaf' → 'leaves')
     - add 'es' for words ending with s/x/z/ch/sh
     - 'y' after consonant → 'ies'
-    - 'potato' → 'potatoes' (explicit special-case)
     - otherwise add 's'
     Uncountables remain unchanged.
     """
-    if word in UNCOUNTABLE_EN:
+    if word in (UNCOUNTABLE_EN if uncountable is None else uncountable):
         return word
+    for sg, pl in IRREGULAR_EN.items():
+        if word.endswith(sg):
+            return word[:-len(sg)] + pl
     if re.search(r"(s|x|z|ch|sh)$", word):
         return word + "es"
     if re.search(r"[^aeiou]y$", word):
         return word[:-1] + "ies"
-    if word.endswith("potato"):
-        return "potatoes"
     return word + "s"
 
 def depluralize_en(word):
@@ -130,98 +153,1087 @@ def depluralize_en(word):
         return w[:-1]
     return w
 
-# Function to replace phrases (longest-first) using normalized matching
-def replace_phrases(text, mapping_norm):
-    items = sorted(mapping_norm.items(), key=lambda kv: -len(kv[0]))  # Longest first
-    pattern = re.compile(
-        r"\b[\wÀ-ÖØ-öø-ÿ]+(?:\s+[\wÀ-ÖØ-öø-ÿ]+)+\b", flags=re.UNICODE
-    )  # Multi-word spans
-    out = text  # Work on a copy
-
-    for norm_src, dst in items:
-        # Whole-line match: replace entire item preserving casing
-        if normalize(out) == norm_src:
-            return match_casing(out, dst)
-
-        # Otherwise, scan candidate spans and replace those that normalize equal
-        def repl(m):
-            span = m.group(0)
-            if normalize(span) == norm_src:
-                return match_casing(span, dst)
-            return span
-
-        out = pattern.sub(repl, out)
+def pluralize_pt(word):
+    """
+    Naive PT plural of a (lowercase, accented) singular:
+    - irregular -ão words from IRREGULAR_PT ('pão' → 'pães')
+    - words ending in s/x stay unchanged
+    - suffix rules: -ão → -ões, -al → -ais, -el → -éis, -m → -ns, -r → -res, ...
+    - otherwise add 's'
+    """
+    if word in IRREGULAR_PT:
+        return IRREGULAR_PT[word]
+    if word.endswith(("s", "x")):
+        return word
+    for sg, pl in PT_PLURAL_SUFFIXES:
+        if word.endswith(sg):
+            return word[:-len(sg)] + pl
+    return word + "s"
+
+# Normalized plurals a PT singular may appear as (the +s form, the rule form, and all -ão variants)
+def plural_forms_pt(word):
+    b = normalize(word)
+    forms = {b + "s", normalize(pluralize_pt(word))}
+    if b.endswith("ao"):
+        forms.update(b[:-2] + p for p in PT_AO_PLURALS)
+    forms.discard(b)
+    return forms
+
+# Plurals an EN singular may appear as (the +s form and the rule form, ignoring uncountables)
+def plural_forms_en(word):
+    forms = {word + "s", pluralize_en(word, ())}
+    forms.discard(word)
+    return forms
+
+# Does the preferred candidate of a word take a plural? (not already plural, noun/adjective)
+def takes_plural(cands):
+    return cands[0].number != "pl" and cands[0].pos in PLURAL_POS
+
+# EN plural for a PT word (its preferred translation, pluralized; an adjective stays as it is)
+def plural_en_of(cands, uncountable_en):
+    if cands[0].pos == "adj":
+        return cands[0].en
+    return pluralize_en(cands[0].en, uncountable_en)
+
+# Does an EN word get plural forms? (English adjectives have none)
+def takes_plural_en(cands):
+    return takes_plural(cands) and cands[0].pos != "adj"
+
+# PT plural for an EN word: the candidate tagged "pl", else the PT rules
+# (uncountable_pt holds normalized words, which stay singular)
+def plural_pt_of(cands, uncountable_pt):
+    pl = next((c.pt for c in cands if c.number == "pl"), None)
+    if pl is None:
+        pt = cands[0].pt
+        pl = pt if normalize(pt) in uncountable_pt or " " in pt else pluralize_pt(pt)
+    return pl
+
+def build_plurals(words, uncountable_en, uncountable_pt):
+    """
+    Expand every singular in the word index into its plural forms, once:
+    normalized PT plural → EN plural, and normalized EN plural → PT plural
+    (the candidate tagged "pl" if there is one, else the PT plural rules;
+    uncountable PT words stay singular). Forms that are glossary words
+    themselves are left out, since a direct hit always wins.
+    """
+    uncountable_pt = {normalize(w) for w in uncountable_pt}
+    singular_pt = [(k, c) for k, c in words.pt.items() if takes_plural(c)]
+    singular_en = [(k, c) for k, c in words.en.items() if takes_plural_en(c)]
+    pt_en = {}
+    for k, cands in singular_pt:  # Plain +s first, so it wins over a rule form of another word
+        pt_en.setdefault(k + "s", plural_en_of(cands, uncountable_en))
+    for k, cands in singular_pt:
+        for form in plural_forms_pt(cands[0].pt):
+            pt_en.setdefault(form, plural_en_of(cands, uncountable_en))
+    en_pt = {}
+    for k, cands in singular_en:
+        pl = plural_pt_of(cands, uncountable_pt)
+        for form in plural_forms_en(k):
+            en_pt.setdefault(form, pl)
+    return (
+        {form: v for form, v in pt_en.items() if form not in words.pt},
+        {form: v for form, v in en_pt.items() if form not in words.en},
+    )
+
+# Character trigrams of a word, with a space marking each end (" bat", "ata", "ta ")
+def trigrams(word):
+    w = " " + word + " "
+    return [w[i:i + 3] for i in range(len(w) - 2)]
+
+def count_trigrams(lines):
+    counts = {}
+    for line in lines:
+        for word in normalize(line).split():
+            for t in trigrams(word):
+                counts[t] = counts.get(t, 0) + 1
+    return counts
+
+def build_trigrams(pt_lines, en_lines, alpha=TRIGRAM_SMOOTHING):
+    """
+    Trigram → log P(trigram | PT) - log P(trigram | EN), from the sample text.
+    Positive values lean Portuguese, negative English; unseen trigrams score 0.
+    """
+    pt = count_trigrams(pt_lines)
+    en = count_trigrams(en_lines)
+    vocab = sorted(set(pt) | set(en))
+    total_pt = sum(pt.values()) + alpha * len(vocab)
+    total_en = sum(en.values()) + alpha * len(vocab)
+    return {t: math.log((pt.get(t, 0) + alpha) / total_pt) - math.log((en.get(t, 0) + alpha) / total_en) for t in vocab}
+
+# Detector vote of a known word: +1 Portuguese only, -1 English only, 0 in both
+# languages (plural forms included); None if the word is not in the lexicon
+def word_language(norm, tables):
+    pt = norm in tables["NORM_PT_EN"] or norm in tables["PLURAL_PT_EN"]
+    en = norm in tables["NORM_EN_PT"] or norm in tables["PLURAL_EN_PT"]
+    return 0.0 if pt and en else 1.0 if pt else -1.0 if en else None
+
+# One lookup per word instead of four on the detection hot path
+def build_word_lang(tables):
+    keys = set(tables["NORM_PT_EN"]) | set(tables["PLURAL_PT_EN"]) | set(tables["NORM_EN_PT"]) | set(tables["PLURAL_EN_PT"])
+    return {k: word_language(k, tables) for k in sorted(keys)}
+
+# Find the source file of each table (.tsv preferred, .json accepted)
+def source_files(path=LEXICON_DIR):
+    files = {}
+    for name, base in LEXICON_SOURCES.items():
+        for ext in (".tsv", ".json"):
+            p = os.path.join(path, base + ext)
+            if os.path.exists(p):
+                files[name] = p
+                break
+    return files
+
+# Read one source: JSON as-is, TSV as rows of tab-separated columns
+def read_source(p):
+    with open(p, encoding="utf-8") as fh:
+        if p.endswith(".json"):
+            return json.load(fh)
+        rows = []
+        for line in fh:
+            line = line.rstrip("\r\n")
+            if not line.strip() or line.lstrip().startswith("#"):  # Skip blanks and comments
+                continue
+            rows.append([c.strip() for c in line.split("\t")])
+        return rows
+
+# Row = [pt, en, "tag,tag"]; the tags column is optional
+def make_entry(row):
+    tags = [t.strip() for t in row[2].split(",")] if len(row) > 2 and row[2] else []
+    pos = next((t for t in tags if t not in ("sg", "pl", "pref")), "")
+    number = "pl" if "pl" in tags else "sg" if "sg" in tags else ""
+    return Entry(row[0], row[1], pos, number, "pref" in tags)
+
+# Turn the source files into entry lists (glossaries) and sets (uncountables)
+def load_sources(files):
+    sources = {}
+    for name, p in files.items():
+        data = read_source(p)
+        if name.startswith("UNCOUNTABLE_"):
+            sources[name] = {row[0] if isinstance(row, list) else row for row in data}
+        elif name.startswith("NGRAM_"):  # Plain lines of text
+            sources[name] = [row[0] if isinstance(row, list) else row for row in data]
+        elif isinstance(data, dict):  # JSON object: {pt: en}, no tags
+            sources[name] = [make_entry([k, v]) for k, v in data.items()]
+        else:
+            sources[name] = [make_entry(row) for row in data]
+    return sources
+
+class BiIndex:
+    """
+    Glossary indexed both ways: normalized PT → candidate entries and
+    normalized EN → candidate entries. Nothing is lost when several rows share
+    a word ("peixe"/"peixes" → "fish"); the first candidate is the preferred one
+    (a row tagged "pref", otherwise the first row listed in the source).
+    """
+    def __init__(self, pt, en):
+        self.pt = pt
+        self.en = en
+
+    @classmethod
+    def build(cls, entries):
+        pt = {}
+        en = {}
+        for e in dict.fromkeys(entries):  # Identical rows count once
+            pt.setdefault(normalize(e.pt), []).append(e)
+            en.setdefault(normalize(e.en), []).append(e)
+        for side in (pt, en):
+            for k, cands in side.items():
+                side[k] = tuple(sorted(cands, key=lambda e: not e.pref))  # Stable: "pref" first, then file order
+        return cls(pt, en)
+
+    # All candidates for a word, preferred first
+    def pt_en(self, word):
+        return self.pt.get(normalize(word), ())
+
+    def en_pt(self, word):
+        return self.en.get(normalize(word), ())
+
+    # Normalized word → preferred translation (the tables used on the hot path)
+    def norm_pt_en(self):
+        return {k: cands[0].en for k, cands in self.pt.items()}
+
+    def norm_en_pt(self):
+        return {k: cands[0].pt for k, cands in self.en.items()}
+
+# Build every lookup table the translator uses from the source tables
+def build_lexicon(sources):
+    words = BiIndex.build(sources["PT_EN"])
+    phrases = BiIndex.build(sources["PHRASES_PT_EN"])
+    plural_pt_en, plural_en_pt = build_plurals(words, sources["UNCOUNTABLE_EN"], sources["UNCOUNTABLE_PT"])
+    tables = {
+        "PT_EN": {e.pt: e.en for e in reversed(sources["PT_EN"])},  # First row wins
+        "EN_PT": {cands[0].en: cands[0].pt for cands in words.en.values()},  # Preferred reverse translation
+        "PHRASES_PT_EN": {e.pt: e.en for e in reversed(sources["PHRASES_PT_EN"])},
+        "PHRASES_EN_PT": {cands[0].en: cands[0].pt for cands in phrases.en.values()},
+        "UNCOUNTABLE_EN": set(sources["UNCOUNTABLE_EN"]),
+        "UNCOUNTABLE_PT": set(sources["UNCOUNTABLE_PT"]),
+        "WORDS": words,
+        "PHRASES": phrases,
+        # Normalized lookups (accents and case removed), shared by detection and both passes
+        "NORM_PT_EN": words.norm_pt_en(),
+        "NORM_EN_PT": words.norm_en_pt(),
+        "NORM_PH_PT_EN": phrases.norm_pt_en(),
+        "NORM_PH_EN_PT": phrases.norm_en_pt(),
+        "PLURAL_PT_EN": plural_pt_en,
+        "PLURAL_EN_PT": plural_en_pt,
+        "TRIGRAMS": build_trigrams(sources["NGRAM_PT"], sources["NGRAM_EN"]),
+    }
+    tables["WORD_LANG"] = build_word_lang(tables)
+    return tables
+
+# Cheap staleness fingerprint: file name, size and modification time of each source
+def source_fingerprint(files):
+    out = {}
+    for name, p in files.items():
+        st = os.stat(p)
+        out[name] = [os.path.basename(p), st.st_size, st.st_mtime_ns]
     return out
 
+def source_digest(p):
+    with open(p, "rb") as fh:
+        return hashlib.sha256(fh.read()).digest()
+
+# Lexicon version: hash of the per-file digests, so a reload only has to
+# hash the files that changed
+def source_version(files, digests=None):
+    h = hashlib.sha256()
+    for name in sorted(files):
+        h.update(name.encode("utf-8") + b"\0")
+        h.update(digests[name] if digests else source_digest(files[name]))
+    return h.hexdigest()[:16]
+
+# Map a compiled lexicon (see menu_storage) and return (header, tables) with the
+# uncountables as sets and the word and phrase indexes as BiIndex
+def open_lexicon(path):
+    header, packed = open_compiled(path)
+    tables = dict(packed)
+    for name in ("UNCOUNTABLE_EN", "UNCOUNTABLE_PT"):  # Tiny: plain sets
+        tables[name] = set(packed[name])
+    for name in ("WORDS", "PHRASES"):  # Both sides of each index
+        tables[name] = BiIndex(packed[name + "_PT"], packed[name + "_EN"])
+    return header, tables
+
+# Use the compiled lexicon when it is up to date, otherwise build from the sources
+def load_lexicon(path=LEXICON_DIR, shared=True):
+    if shared and SHARED_LEXICON:  # Started by a process that shares its lexicon: map it, no loading at all
+        try:
+            header, tables = open_lexicon(SHARED_LEXICON)
+        except (OSError, ValueError) as exc:
+            warnings.warn(f"Shared lexicon {SHARED_LEXICON} not available ({exc}); loading {path}")
+        else:
+            return header["version"], tables
+    files = source_files(path)
+    compiled = os.path.join(path, COMPILED_LEXICON)
+    if os.path.exists(compiled):
+        try:
+            header, tables = open_lexicon(compiled)
+        except ValueError as exc:
+            warnings.warn(f"{exc}; rebuilding from sources")
+        else:
+            if not files or header["sources"] == source_fingerprint(files):
+                return header["version"], tables
+            warnings.warn(f"{compiled} is stale; run: python menu_lexicon.py compile")
+    if len(files) != len(LEXICON_SOURCES):
+        missing = sorted(set(LEXICON_SOURCES) - set(files))
+        raise FileNotFoundError(f"Lexicon sources not found in {path}: {', '.join(missing)}")
+    return source_version(files), build_lexicon(load_sources(files))
+
+# Load the lexicon once at import
+LEXICON_VERSION, LEXICON = load_lexicon()
+PT_EN = LEXICON["PT_EN"]
+EN_PT = LEXICON["EN_PT"]
+PHRASES_PT_EN = LEXICON["PHRASES_PT_EN"]
+PHRASES_EN_PT = LEXICON["PHRASES_EN_PT"]
+UNCOUNTABLE_EN = LEXICON["UNCOUNTABLE_EN"]
+UNCOUNTABLE_PT = LEXICON["UNCOUNTABLE_PT"]
+WORDS = LEXICON["WORDS"]  # Word index with every candidate, both ways
+PHRASES = LEXICON["PHRASES"]  # Phrase index with every candidate, both ways
+NORM_PT_EN = LEXICON["NORM_PT_EN"]  # Normalized PT→EN
+NORM_EN_PT = LEXICON["NORM_EN_PT"]  # Normalized EN→PT
+NORM_PH_PT_EN = LEXICON["NORM_PH_PT_EN"]  # Normalized phrases PT→EN
+NORM_PH_EN_PT = LEXICON["NORM_PH_EN_PT"]  # Normalized phrases EN→PT
+PLURAL_PT_EN = LEXICON["PLURAL_PT_EN"]  # Normalized PT plural → EN plural
+PLURAL_EN_PT = LEXICON["PLURAL_EN_PT"]  # Normalized EN plural → PT plural
+TRIGRAMS = LEXICON["TRIGRAMS"]  # Trigram → PT-vs-EN log-odds
+WORD_LANG = LEXICON["WORD_LANG"]  # Normalized word → detector vote (+1 PT, -1 EN, 0 both)
+
+# Swap in a new set of tables (see menu_lexicon.LexiconManager). One dict update,
+# so a running translation sees each table either entirely old or entirely new.
+def install_lexicon(version, tables):
+    globals().update(tables, LEXICON_VERSION=version, LEXICON=tables)
+
+# --- Tokenization: split and normalize each item once ---
+
+TOKEN = re.compile(r"\S+")  # Whitespace-separated tokens
+
+# One token: original text, normalized form, its offsets in the item and its Casing
+Token = namedtuple("Token", "text norm start end casing")
+# One item: original text, normalized text, whether offsets line up, and its tokens
+Line = namedtuple("Line", "text norm aligned tokens")
+# Result of translate_spans: the text and its (src_start, src_end, dst_start, dst_end) spans
+SpanTranslation = namedtuple("SpanTranslation", "text spans")
+
+def tokenize(text):
+    """
+    Split an item into Token records, normalizing it only once.
+    When every character folds to exactly one character (ASCII, accented Latin),
+    offsets are kept, so each token's normalized form is a slice of the normalized line.
+    """
+    aligned = is_aligned(text)
+    norm = normalize(text)
+    tokens = []
+    for m in TOKEN.finditer(text):
+        w = m.group()
+        s, e = m.span()
+        tokens.append(Token(w, norm[s:e] if aligned else normalize(w), s, e, casing_of(w)))  # Casing classified once
+    return Line(text, norm, aligned, tokens)
+
+# --- Casing ---
+
+class Casing(IntEnum):
+    """
+    How the casing of a source word or span is carried over to its translation:
+    LOWER   lower case or no letters ("frango", "25,90"): translation as listed
+    UPPER   ALL CAPS: translation in caps
+    TITLE   every word capitalized ("Batata Frita"): every word capitalized
+    MIXED   anything else that starts with a capital ("Arroz e feijão",
+            "McDonald's"): only the first letter is capitalized
+    A word that starts in lower case but has capitals further on ("iPhone")
+    counts as LOWER. Words that are not translated are always kept as typed.
+    """
+    LOWER = 0
+    UPPER = 1
+    TITLE = 2
+    MIXED = 3
+
+def casing_of(text):
+    if text.islower():  # Most menu words: one check
+        return Casing.LOWER
+    if text.isupper():
+        return Casing.UPPER
+    if text.istitle():
+        return Casing.TITLE
+    return Casing.MIXED if text[:1].isupper() else Casing.LOWER
+
+# dst with the given casing applied
+def recase(dst, casing):
+    if casing == Casing.UPPER:
+        return dst.upper()
+    if casing == Casing.TITLE:
+        return " ".join(w.capitalize() for w in dst.split())
+    if casing == Casing.MIXED:
+        return dst[:1].upper() + dst[1:]
+    return dst
+
+CASED_FORMS = tuple({} for _ in Casing)  # Per casing: lexicon translation → cased form
+
+def cased(dst, casing):
+    """
+    Cased form of a lexicon translation: computed the first time, then a dict lookup.
+    Only for lexicon values (a bounded set); use match_casing for arbitrary text.
+    """
+    if not casing:  # LOWER: nothing to do
+        return dst
+    forms = CASED_FORMS[casing]
+    form = forms.get(dst)
+    if form is None:
+        form = forms[dst] = recase(dst, casing)
+    return form
+
+# Function to mirror capitalization from source to destination
+def match_casing(src, dst):
+    return recase(dst, casing_of(src))
+
+# --- Phrase pass ---
+
+# Multi-word spans (runs of words separated only by whitespace), compiled once
+PHRASE_SPAN = re.compile(r"\b[\wÀ-ÖØ-öø-ÿ]+(?:\s+[\wÀ-ÖØ-öø-ÿ]+)+\b", flags=re.UNICODE)
+# A whitespace token without the punctuation around it (span-preserving mode);
+# hyphens, slashes and apostrophes inside it stay, as in the plain translation
+WORD_SPAN = re.compile(r"[\wÀ-ÖØ-öø-ÿ](?:\S*[\wÀ-ÖØ-öø-ÿ])?")
+
+def match_phrases(line, mapping_norm):
+    """Return (start, end, replacement) for every known phrase in a tokenized line."""
+    text = line.text
+    # If the entire line matches a phrase once normalized, replace all of it
+    dst = mapping_norm.get(line.norm)
+    if dst is not None:
+        return [(0, len(text), cased(dst, casing_of(text)))]
+
+    # Otherwise, look each candidate span up using the already normalized line
+    found = []
+    for m in PHRASE_SPAN.finditer(text):
+        s, e = m.span()
+        span = m.group()  # Candidate phrase fragment
+        dst = mapping_norm.get(line.norm[s:e] if line.aligned else normalize(span))
+        if dst is not None:
+            found.append((s, e, cased(dst, casing_of(span))))  # Keep the span's casing
+    return found
+
+# Function to replace known phrases in a plain string
+def replace_phrases(text, mapping_norm):
+    out = []
+    pos = 0
+    for s, e, dst in match_phrases(tokenize(text), mapping_norm):
+        out.append(text[pos:s])  # Text before the phrase
+        out.append(dst)  # Replacement
+        pos = e
+    out.append(text[pos:])  # Rest of the line
+    return "".join(out)
+
+def phrase_units(line, mapping_norm, found=None):
+    """
+    Apply the phrase pass to a tokenized line.
+    Returns a list of units for the word pass: Token records still to translate,
+    or plain strings that are already translated phrase words.
+    """
+    tokens = line.tokens
+    if found is None:
+        found = match_phrases(line, mapping_norm)
+    if not found:
+        return tokens  # Nothing replaced: translate every token
+    units = []
+    phrases = iter(found)
+    ph = next(phrases, None)
+    k = 0
+    while k < len(tokens):
+        tok = tokens[k]
+        if ph is None or tok.end <= ph[0]:  # Token before the next phrase
+            units.append(tok)
+            k += 1
+            continue
+        # Rebuild the tokens touched by one or more phrases
+        parts = []
+        pos = tok.start
+        end = tok.end
+        while ph is not None and ph[0] < end:
+            s, e, dst = ph
+            parts.append(line.text[pos:s])  # Source text before the phrase
+            parts.append(dst)  # Replaced phrase
+            pos = e
+            while k + 1 < len(tokens) and tokens[k].end < e:  # Token holding the phrase end
+                k += 1
+            end = tokens[k].end
+            ph = next(phrases, None)
+        parts.append(line.text[pos:end])  # Source text after the last phrase
+        units.extend(split_units(parts))
+        k += 1
+    return units
+
+def split_units(parts):
+    """
+    Split rebuilt text back into units.
+    parts alternate source text and replaced phrases; replaced words are final,
+    words glued to source text (e.g. "fries," or "(french") are looked up again like any other token.
+    """
+    pieces = []
+    glued = False  # Does the last piece continue into the next part?
+    for i, part in enumerate(parts):
+        words = part.split()
+        if not words:
+            glued = glued and not part
+            continue
+        if glued and not part[0].isspace():
+            pieces[-1] = [pieces[-1][0] + words[0], False]  # Merge with the previous piece
+            words = words[1:]
+        pieces.extend([w, i % 2 == 1] for w in words)  # Odd parts are replaced phrases
+        glued = not part[-1].isspace()
+    return [w if final else Token(w, normalize(w), None, None, casing_of(w)) for w, final in pieces]
+
+# --- Fuzzy matching for misspelled words ---
+
+def edit_distance(a, b, limit):
+    """
+    Edit distance between a and b, counting an insertion, deletion, substitution
+    or swap of two neighbouring letters ("batatta", "fejao") as one edit.
+    Stops early and returns limit + 1 once the distance is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # A typo is usually in one place: drop the common prefix and suffix first
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    j = 0
+    while j < n - i and a[-1 - j] == b[-1 - j]:
+        j += 1
+    a = a[i:len(a) - j]
+    b = b[i:len(b) - j]
+    if not a or not b:
+        return min(max(len(a), len(b)), limit + 1)
+    before = None  # Row i - 2, for swaps
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] * (len(b) + 1)
+        for j, cb in enumerate(b, 1):
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if j > 1 and i > 1 and ca == b[j - 2] and cb == a[i - 2]:
+                d = min(d, before[j - 2] + 1)
+            cur[j] = d
+        if min(cur) > limit:  # Every path is already too long
+            return limit + 1
+        before, prev = prev, cur
+    return min(prev[-1], limit + 1)
+
+# The word itself and every string made by deleting up to `distance` letters
+def deletes(word, distance):
+    found = {word}
+    level = found
+    for _ in range(distance):
+        level = {w[:i] + w[i + 1:] for w in level for i in range(len(w))}
+        found |= level
+    return found
+
+class DeletionIndex:
+    """
+    SymSpell-style index: every key is stored under all its deletion variants,
+    so the keys close to a misspelled word are found by generating the word's own
+    deletions and looking them up, instead of comparing it with every key.
+    Only the first `prefix` letters are indexed, which bounds the number of
+    variants per key on long words; candidates are checked on the full word.
+    """
+    def __init__(self, keys, distance=1, prefix=FUZZY_PREFIX):
+        self.distance = distance
+        self.prefix = prefix
+        index = {}
+        for key in keys:
+            for d in deletes(key[:prefix], distance):
+                index.setdefault(d, []).append(key)
+        self.index = index
+
+    # Closest key within the distance (ties: alphabetical order), or None
+    def lookup(self, word):
+        best = None
+        limit = self.distance
+        seen = set()
+        get = self.index.get
+        for d in deletes(word[:self.prefix], self.distance):
+            for key in get(d, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                dist = edit_distance(word, key, limit)
+                if dist <= limit and (best is None or (dist, key) < best):
+                    best = dist, key
+                    limit = dist  # Only as close or closer from now on
+        return None if best is None else best[1]
+
+# Single words of the glossary and their plurals, long enough to be corrected
+def fuzzy_keys(words, plurals):
+    return sorted({k for t in (words, plurals) for k in t if len(k) >= FUZZY_MIN_LENGTH and k.isalpha()})
+
+def fuzzy_index(direction):
+    """
+    (words, plurals, DeletionIndex) for one direction. The index is built on first
+    use and rebuilt when the tables are replaced (lexicon reload, compact form)
+    or FUZZY_DISTANCE changes.
+    """
+    if direction == "pt_en":
+        words, plurals = NORM_PT_EN, PLURAL_PT_EN
+    else:
+        words, plurals = NORM_EN_PT, PLURAL_EN_PT
+    entry = FUZZY_INDEXES.get(direction)
+    if entry is None or entry[0] is not words or entry[1] is not plurals or entry[2].distance != FUZZY_DISTANCE:
+        entry = FUZZY_INDEXES[direction] = words, plurals, DeletionIndex(fuzzy_keys(words, plurals), FUZZY_DISTANCE)
+    return entry
+
+def fuzzy_lookup(norm, direction):
+    """
+    Translation of the lexicon word closest to a normalized token that is not in
+    the lexicon, or None. Used only when FUZZY_DISTANCE > 0.
+    """
+    return fuzzy_correct(norm, *fuzzy_index(direction))
+
+# Same, with the tables and the index passed in (used by Translator)
+def fuzzy_correct(norm, words, plurals, index):
+    if len(norm) < FUZZY_MIN_LENGTH or not norm.isalpha():  # Short words and numbers are left alone
+        return None
+    key = index.lookup(norm)
+    if key is None:
+        return None
+    tr = words.get(key)
+    return plurals.get(key) if tr is None else tr
+
 # --- Word-by-word passes with basic plural logic ---
 
-def translate_tokens_pt_en(text):
+def translate_token_pt_en(tok):
+    """
+    Translate one Portuguese token into English:
+    - Try exact mapping; if not found, try the precomputed plural
+      forms (PT plural → EN plural), then the closest word if fuzzy
+      matching is on.
     """
-    Translate Portuguese tokens into English:
-    - Try exact mapping; if not found and looks plural in PT,
-      try singular lookup and then pluralize in EN.
-    """
-    words = [w for w in text.split() if w]
-    result = []
-    for w in words:
-        base = normalize(w)
-        tr = NORM_PT_EN.get(base)
-        if tr is None and is_plural_pt(w):
-            singular_base = depluralize_pt(w)
-            tr_sing = NORM_PT_EN.get(singular_base)
-            if tr_sing:
-                tr = pluralize_en(tr_sing)
-        result.append(match_casing(w, tr if tr else w))
-    return " ".join(result)
+    tr = NORM_PT_EN.get(tok.norm)
+    if tr is None:
+        tr = PLURAL_PT_EN.get(tok.norm)  # No regex here: plurals were expanded at load time
+        if tr is None and FUZZY_DISTANCE:
+            tr = fuzzy_lookup(tok.norm, "pt_en")
+    return cased(tr, tok.casing) if tr else tok.text
+
+def translate_token_en_pt(tok):
+    """
+    Translate one English token into Portuguese:
+    - Try exact mapping; if not found, try the precomputed plural
+      forms (EN plural → PT plural), then the closest word if fuzzy
+      matching is on.
+    """
+    tr = NORM_EN_PT.get(tok.norm)
+    if tr is None:
+        tr = PLURAL_EN_PT.get(tok.norm)
+        if tr is None and FUZZY_DISTANCE:
+            tr = fuzzy_lookup(tok.norm, "en_pt")
+    return cased(tr, tok.casing) if tr else tok.text
+
+# Join the word pass output: strings are final, tokens get translated
+def translate_units(units, translate_token):
+    return " ".join(u if isinstance(u, str) else translate_token(u) for u in units)
+
+def translate_tokens_pt_en(text):
+    return translate_units(tokenize(text).tokens, translate_token_pt_en)
 
 def translate_tokens_en_pt(text):
+    return translate_units(tokenize(text).tokens, translate_token_en_pt)
+
+# --- Language detection ---
+
+# Spelling evidence for an unknown word: its trigram log-odds, scaled and capped
+# so that it never outweighs a dictionary hit
+def trigram_score(norm, trigrams=None):
+    w = " " + norm + " "
+    get = (TRIGRAMS if trigrams is None else trigrams).get
+    s = 0.0
+    for i in range(len(w) - 2):
+        s += get(w[i:i + 3], 0.0)  # Unseen trigrams are neutral
+    s *= DETECT_TRIGRAM_SCALE
+    return -DETECT_TRIGRAM_CAP if s < -DETECT_TRIGRAM_CAP else DETECT_TRIGRAM_CAP if s > DETECT_TRIGRAM_CAP else s
+
+# Evidence from one word, between -1 (English) and +1 (Portuguese): its WORD_LANG vote,
+# or for an unknown word its spelling. Filled in as words are seen, since a menu repeats
+# the same words over and over; cleared when full.
+class WordVotes(dict):
+    def __init__(self, word_lang, trigrams):
+        super().__init__()
+        self.word_lang = word_lang
+        self.trigrams = trigrams
+
+    def __missing__(self, norm):
+        vote = self.word_lang.get(norm)
+        if vote is None:
+            vote = trigram_score(norm, self.trigrams)
+        if len(self) >= WORD_VOTE_MEMO_SIZE:
+            self.clear()
+        self[norm] = vote
+        return vote
+
+# Votes for the installed tables, rebuilt when WORD_LANG or TRIGRAMS is replaced
+def word_votes():
+    global VOTES
+    votes = VOTES
+    if votes is None or votes.word_lang is not WORD_LANG or votes.trigrams is not TRIGRAMS:
+        votes = VOTES = WordVotes(WORD_LANG, TRIGRAMS)
+    return votes
+
+def score_line(line, phrases_pt, phrases_en, votes):
     """
-    Translate English tokens into Portuguese:
-    - Try exact mapping; if not found, attempt to singularize EN
-      and map that to PT (keeps simple singular PT at Level 4).
+    PT-minus-EN score of a tokenized line (positive = Portuguese), in one pass.
+    Each word moves the score by at most 1, so scoring stops as soon as the
+    remaining words can no longer flip the sign.
     """
-    words = [w for w in text.split() if w]
-    result = []
-    for w in words:
-        base = normalize(w)
-        tr = NORM_EN_PT.get(base)
-        if tr is None:
-            singular_base = depluralize_en(w)
-            tr_sing = NORM_EN_PT.get(singular_base)
-            if tr_sing:
-                tr = tr_sing  # keep singular PT (morphology deferred to next levels)
-        result.append(match_casing(w, tr if tr else w))
-    return " ".join(result)
-
-# Heuristic to detect translation direction for a given item
+    score = 0.0
+    if line.norm in phrases_pt:  # Whole line is a known PT phrase
+        score += DETECT_PHRASE_WEIGHT
+    if line.norm in phrases_en:  # Whole line is a known EN phrase
+        score -= DETECT_PHRASE_WEIGHT
+    left = len(line.tokens)
+    for tok in line.tokens:
+        left -= 1
+        score += votes[tok.norm]
+        if score > left or score < -left:  # Decided: early exit
+            break
+    return score
+
+def direction_score(line):
+    return score_line(line, NORM_PH_PT_EN, NORM_PH_EN_PT, word_votes())
+
+# Direction plus a confidence between 0.5 (no evidence) and 1
+def detect_language(text):
+    return detect_language_line(tokenize(text))
+
+def detect_language_line(line):
+    score = direction_score(line)
+    confidence = 1.0 / (1.0 + math.exp(-DETECT_CONFIDENCE_SLOPE * abs(score)))
+    return ("en_pt" if score < 0 else "pt_en"), confidence
+
+# Detect translation direction for a given item (ties go to PT → EN)
 def detect_direction(text):
-    tokens = [w for w in text.split() if w]
-    if not tokens:
+    return detect_direction_line(tokenize(text))
+
+def detect_direction_line(line):
+    return "en_pt" if direction_score(line) < 0 else "pt_en"
+
+# Dictionary-hit counting only (the previous detector, kept for comparison in menu_bench.py)
+def detect_direction_counts(line):
+    if not line.tokens:
         return "pt_en"
     score_pt = 0
     score_en = 0
-    norm_line = normalize(text)
-    if norm_line in NORM_PH_PT_EN:
+    if line.norm in NORM_PH_PT_EN:  # Whole line is a known PT phrase
         score_pt += 3
-    if norm_line in NORM_PH_EN_PT:
+    if line.norm in NORM_PH_EN_PT:  # Whole line is a known EN phrase
         score_en += 3
-    for w in tokens:
-        b = normalize(w)
-        if b in NORM_PT_EN:
+    for tok in line.tokens:
+        if tok.norm in NORM_PT_EN or tok.norm in PLURAL_PT_EN:
             score_pt += 1
-        if b in NORM_EN_PT:
+        if tok.norm in NORM_EN_PT or tok.norm in PLURAL_EN_PT:
             score_en += 1
     return "en_pt" if score_en > score_pt else "pt_en"
 
+# --- Document-level detection ---
+
+def detect_document(items, sample_size=DOC_SAMPLE_SIZE):
+    """
+    Direction of a whole menu from up to sample_size items spread over it, and a
+    confidence: the share of the sampled evidence that points that way (0.5 to 1).
+    """
+    step = max(1, len(items) // max(1, sample_size))
+    pt = en = 0.0
+    for item in items[::step][:sample_size]:
+        score = direction_score(tokenize(item))
+        if score > 0:
+            pt += score
+        else:
+            en -= score
+    if not pt + en:  # No evidence at all
+        return "pt_en", 0.5
+    return ("en_pt" if en > pt else "pt_en"), max(pt, en) / (pt + en)
+
+# Does a line carry evidence against the menu's language? (a word or whole-line
+# phrase found only in the other language; unknown and shared words do not count)
+def disagrees(line, direction):
+    if line.norm in (NORM_PH_EN_PT if direction == "pt_en" else NORM_PH_PT_EN):
+        return True
+    get = WORD_LANG.get
+    other = -1.0 if direction == "pt_en" else 1.0
+    return any(get(tok.norm) == other for tok in line.tokens)
+
+# The menu's direction, unless the line disagrees: then detect it on its own
+def line_direction(line, direction=None):
+    if direction is None or disagrees(line, direction):
+        return detect_direction_line(line)
+    return direction
+
 # Translate a user item with auto-detected direction
 def translate_item_auto(item):
-    direction = detect_direction(item)
+    if PROFILE is not None:  # Profiling on: same result, timed stage by stage
+        return translate_item_profiled(item, PROFILE)
+    line = tokenize(item)  # Split + normalize once
+    if detect_direction_line(line) == "pt_en":
+        units = phrase_units(line, NORM_PH_PT_EN)  # Phrase pass PT→EN
+        return translate_units(units, translate_token_pt_en)  # Word pass PT→EN
+    else:
+        units = phrase_units(line, NORM_PH_EN_PT)  # Phrase pass EN→PT
+        return translate_units(units, translate_token_en_pt)  # Word pass EN→PT
+
+def translate_item_profiled(item, profile, direction=None):
+    """
+    translate_item_auto (or translate_item_directed), recording the time spent in each stage (in ns) and the
+    phrase hits, lexicon hits/misses and plural fallbacks into profile.times and
+    profile.counts. Casing is timed apart from the lookups, token by token.
+    """
+    times = profile.times
+    counts = profile.counts
+    clock = time.perf_counter_ns
+    t0 = clock()
+    line = tokenize(item)
+    t1 = clock()
+    direction = line_direction(line, direction)
+    t2 = clock()
+    if direction == "pt_en":
+        phrases, words, plurals = NORM_PH_PT_EN, NORM_PT_EN, PLURAL_PT_EN
+    else:
+        phrases, words, plurals = NORM_PH_EN_PT, NORM_EN_PT, PLURAL_EN_PT
+    found = match_phrases(line, phrases)
+    units = phrase_units(line, phrases, found)
+    t3 = clock()
+    lookup = plural = fuzzy = casing = 0
+    hits = misses = fallbacks = corrections = 0
+    out = []
+    for u in units:
+        if isinstance(u, str):  # Already translated by the phrase pass
+            out.append(u)
+            continue
+        a = clock()
+        tr = words.get(u.norm)
+        b = clock()
+        lookup += b - a
+        if tr is None:  # Not in the glossary: try the generated plural forms
+            tr = plurals.get(u.norm)
+            a = clock()
+            plural += a - b
+            b = a
+            if tr is not None:
+                fallbacks += 1
+            elif FUZZY_DISTANCE:
+                tr = fuzzy_lookup(u.norm, direction)
+                a = clock()
+                fuzzy += a - b
+                b = a
+                if tr is None:
+                    misses += 1
+                else:
+                    corrections += 1
+            else:
+                misses += 1
+        else:
+            hits += 1
+        out.append(cased(tr, u.casing) if tr else u.text)
+        casing += clock() - b
+    t4 = clock()
+    result = " ".join(out)
+    t5 = clock()
+    for stage, ns in (("tokenize", t1 - t0), ("detect", t2 - t1), ("phrases", t3 - t2), ("lookup", lookup),
+                      ("plurals", plural), ("fuzzy", fuzzy), ("casing", casing), ("join", t5 - t4), ("total", t5 - t0)):
+        times[stage] = times.get(stage, 0) + ns
+    for name, n in (("items", 1), ("items_" + direction, 1), ("phrase_hits", len(found)),
+                    ("lexicon_hits", hits), ("lexicon_misses", misses), ("plural_fallbacks", fallbacks),
+                    ("fuzzy_corrections", corrections)):
+        counts[name] = counts.get(name, 0) + n
+    return result
+
+# Translate an item of a menu whose direction is known (see line_direction)
+def translate_item_directed(item, direction=None):
+    if PROFILE is not None:
+        return translate_item_profiled(item, PROFILE, direction)
+    line = tokenize(item)
+    if line_direction(line, direction) == "pt_en":
+        return translate_units(phrase_units(line, NORM_PH_PT_EN), translate_token_pt_en)
+    return translate_units(phrase_units(line, NORM_PH_EN_PT), translate_token_en_pt)
+
+# Key under which an item can share its translation with items that differ only in
+# case: the lowercase form of an UPPER or Title item when match_casing puts the casing
+# back exactly (a lone uppercase letter such as "E" in a Title item would not survive
+# the round trip). MIXED items keep their own entry: their words are cased one by one.
+def casing_key(item):
+    casing = casing_of(item)
+    if casing != Casing.UPPER and casing != Casing.TITLE:
+        return item, False
+    folded = item.lower()
+    if recase(folded, casing) != item:
+        return item, False
+    if casing == Casing.TITLE and any(w.isupper() for w in item.split()):
+        return item, False
+    return folded, True
+
+def translate_batch(items, direction=None):
+    """
+    Translate a whole list of items; same results as translate_item_auto on each
+    (or translate_item_directed, when the direction of the menu is given).
+    Items are deduplicated first (exact text, then case-only variants), each pass
+    (detection, phrases, tokens) runs over the unique items, distinct tokens are
+    translated once per direction, and results are scattered back in input order.
+    """
+    keys = {}
+    slots = []
+    for item in items:
+        key, folded = casing_key(item)
+        slots.append((keys.setdefault(key, len(keys)), folded))
+    lines = [tokenize(k) for k in keys]
+    directions = [line_direction(line, direction) for line in lines]
+    units = [phrase_units(line, NORM_PH_PT_EN if d == "pt_en" else NORM_PH_EN_PT)
+             for line, d in zip(lines, directions)]
+    # Distinct tokens per direction; a token's translation depends only on its text
+    words = {"pt_en": {}, "en_pt": {}}
+    for line_units, d in zip(units, directions):
+        seen = words[d]
+        for u in line_units:
+            if not isinstance(u, str) and u.text not in seen:
+                seen[u.text] = u
+    for d, translate_token in (("pt_en", translate_token_pt_en), ("en_pt", translate_token_en_pt)):
+        seen = words[d]
+        for text, tok in seen.items():
+            seen[text] = translate_token(tok)
+    out = [" ".join(u if isinstance(u, str) else words[d][u.text] for u in line_units)
+           for line_units, d in zip(units, directions)]
+    return [match_casing(item, out[k]) if folded else out[k] for item, (k, folded) in zip(items, slots)]
+
+def translate_document(items, sample_size=DOC_SAMPLE_SIZE, threshold=DOC_CONFIDENCE):
+    """
+    Translate a whole menu, detecting its language once from a sample of items.
+    Lines are then translated in that direction without scoring them, except the
+    ones with evidence for the other language; if the sample is not conclusive
+    (confidence below threshold), every item is detected on its own.
+    """
+    direction, confidence = detect_document(items, sample_size)
+    return translate_batch(items, direction if confidence >= threshold else None)
+
+# --- Span-preserving translation ---
+
+def translate_spans(item, direction=None):
+    """
+    Translate an item in place: only the matched phrases and words are rewritten,
+    everything else (punctuation, prices, separators, spacing) is kept as is.
+    Returns SpanTranslation(text, spans), where each span is
+    (src_start, src_end, dst_start, dst_end) for one rewritten part of the item.
+    """
+    line = tokenize(item)
+    direction = line_direction(line, direction)
     if direction == "pt_en":
-        pre = replace_phrases(item, NORM_PH_PT_EN)  # Phrase pass PT→EN
-        return translate_tokens_pt_en(pre)  # Word pass PT→EN
+        phrases, words, plurals = NORM_PH_PT_EN, NORM_PT_EN, PLURAL_PT_EN
     else:
-        pre = replace_phrases(item, NORM_PH_EN_PT)  # Phrase pass EN→PT
-        return translate_tokens_en_pt(pre)  # Word pass EN→PT
+        phrases, words, plurals = NORM_PH_EN_PT, NORM_EN_PT, PLURAL_EN_PT
+    text = line.text
+    found = iter(match_phrases(line, phrases))  # Phrase spans, in order
+    ph = next(found, None)
+    matches = []
+    for tok in line.tokens:
+        m = WORD_SPAN.search(tok.text)  # The token without its punctuation
+        if m is None:
+            continue
+        s, e = tok.start + m.start(), tok.start + m.end()
+        while ph is not None and ph[1] <= s:  # Phrases ending before this word
+            matches.append(ph)
+            ph = next(found, None)
+        if ph is not None and ph[0] < e:  # Word inside a phrase: already translated
+            continue
+        norm = line.norm[s:e] if line.aligned else normalize(m.group())
+        tr = words.get(norm)
+        if tr is None:
+            tr = plurals.get(norm)  # Generated plural forms
+            if tr is None and FUZZY_DISTANCE:
+                tr = fuzzy_lookup(norm, direction)  # Still unknown: closest lexicon word
+        if tr:
+            matches.append((s, e, cased(tr, casing_of(m.group()))))
+    if ph is not None:
+        matches.append(ph)
+        matches.extend(found)
+    # One join at the end; target offsets come from a running length
+    pieces = []
+    spans = []
+    pos = 0
+    size = 0
+    for s, e, dst in matches:
+        pieces.append(text[pos:s])  # Untouched text between matches
+        pieces.append(dst)
+        size += s - pos
+        spans.append((s, e, size, size + len(dst)))
+        size += len(dst)
+        pos = e
+    pieces.append(text[pos:])
+    return SpanTranslation("".join(pieces), spans)
+
+# --- Compiled translators ---
+
+# The tables a Translator needs, taken from the module globals
+def current_tables():
+    return {name: globals()[name] for name in TRANSLATOR_TABLES}
+
+class Translator:
+    """
+    Translator for one direction ("pt_en" or "en_pt") of one set of lexicon tables.
+    The tables, the fuzzy index and the helper functions are bound once, as closure
+    variables of the compiled functions, so translating an item reads no module
+    globals and never looks at the direction again. Several lexicons (one per
+    brand, say) can be loaded side by side in one process.
+    """
+    def __init__(self, tables, direction, fuzzy=None):
+        if direction == "pt_en":
+            names = ("NORM_PH_PT_EN", "NORM_PT_EN", "PLURAL_PT_EN")
+        elif direction == "en_pt":
+            names = ("NORM_PH_EN_PT", "NORM_EN_PT", "PLURAL_EN_PT")
+        else:
+            raise ValueError(f"unknown direction: {direction!r}")
+        self.direction = direction
+        self.phrases, self.words, self.plurals = (tables[name] for name in names)
+        distance = FUZZY_DISTANCE if fuzzy is None else fuzzy  # Fixed when compiled
+        self.fuzzy = DeletionIndex(fuzzy_keys(self.words, self.plurals), distance) if distance else None
+        self.translate_token = self.compile_token()
+        self.translate_line = self.compile_line()
+
+    def __call__(self, item):
+        return self.translate_line(tokenize(item))
+
+    # Same steps as translate_token_pt_en / translate_token_en_pt
+    def compile_token(self):
+        words, plurals, fuzzy = self.words, self.plurals, self.fuzzy
+        words_get, plurals_get, correct, apply_casing = words.get, plurals.get, fuzzy_correct, recase
+        forms = tuple({} for _ in Casing)  # This lexicon's cased translations
+
+        def translate_token(tok):
+            norm = tok.norm
+            tr = words_get(norm)
+            if tr is None:
+                tr = plurals_get(norm)
+                if tr is None and fuzzy is not None:
+                    tr = correct(norm, words, plurals, fuzzy)
+            if not tr:
+                return tok.text  # Not translated: kept exactly as typed
+            casing = tok.casing
+            if not casing:
+                return tr
+            form = forms[casing].get(tr)
+            if form is None:
+                form = forms[casing][tr] = apply_casing(tr, casing)
+            return form
+        return translate_token
+
+    # Phrase pass, then the word pass, on a tokenized line
+    def compile_line(self):
+        phrases, translate_token = self.phrases, self.translate_token
+        match, units_of, join, is_text = match_phrases, phrase_units, " ".join, isinstance
+
+        def translate_line(line):
+            found = match(line, phrases)
+            units = units_of(line, phrases, found) if found else line.tokens
+            return join([u if is_text(u, str) else translate_token(u) for u in units])
+        return translate_line
+
+class AutoTranslator:
+    """
+    Drop-in for translate_item_auto built on two compiled Translators: the
+    language detector is compiled the same way and picks the translator of
+    each item. Without tables it uses the lexicon currently installed.
+    AutoTranslator.load(path) reads another lexicon folder.
+    """
+    def __init__(self, tables=None, fuzzy=None, version=None):
+        if tables is None:
+            tables, version = current_tables(), LEXICON_VERSION
+        self.tables = tables
+        self.version = version
+        self.pt_en = Translator(tables, "pt_en", fuzzy)
+        self.en_pt = Translator(tables, "en_pt", fuzzy)
+        self.score = self.compile_score()
+        self.translate = self.compile()
+
+    @classmethod
+    def load(cls, path, fuzzy=None):
+        version, tables = load_lexicon(path, shared=False)  # The shared image holds the default lexicon
+        return cls(tables, fuzzy, version)
+
+    def __call__(self, item):
+        return self.translate(item)
+
+    def detect(self, item):
+        return "en_pt" if self.score(tokenize(item)) < 0 else "pt_en"
+
+    # score_line with this lexicon's tables and its own vote memo
+    def compile_score(self):
+        tables = self.tables
+        ph_pt, ph_en = tables["NORM_PH_PT_EN"], tables["NORM_PH_EN_PT"]
+        votes = WordVotes(tables["WORD_LANG"], tables["TRIGRAMS"])
+
+        def score(line):
+            return score_line(line, ph_pt, ph_en, votes)
+        return score
+
+    def compile(self):
+        score, tok = self.score, tokenize
+        pt, en = self.pt_en.translate_line, self.en_pt.translate_line
+
+        def translate(item):
+            line = tok(item)
+            return en(line) if score(line) < 0 else pt(line)
+        return translate
 
 # Remove trailing punctuation like commas or dots for cleaner input
 def clean_tail_punct(s):
@@ -0,0 +1,381 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from functools import partial
+from multiprocessing import Pool, get_start_method, util
+
+import level4_menu_translator as engine
+from level4_menu_translator import clean_tail_punct, translate_batch, translate_item_auto, translate_item_directed, translate_spans
+from menu_cache import PersistentCache, TranslationCache
+from menu_lexicon import LexiconManager, share_lexicon, unshare_lexicon
+from menu_manifest import Manifest
+from menu_profile import FORMATS as PROFILE_FORMATS, Profile, export
+from menu_storage import CompactTable, compact_lexicon
+
+FORMATS = ("text", "csv", "jsonl")
+
+translate_item = translate_item_auto
+document_direction = None
+preserve_spans = False
+watcher = None
+
+def preserve_item(item, direction=None):
+    return translate_spans(item, direction).text
+
+def set_cache(size, policy="lru", db=None, direction=None, preserve=False, compiled=False):
+    global translate_item, document_direction, preserve_spans
+    document_direction = direction
+    preserve_spans = preserve
+    if preserve:
+        translate = partial(preserve_item, direction=direction)
+    elif compiled and direction is None:
+        translate = engine.AutoTranslator().translate
+    else:
+        translate = translate_item_auto if direction is None else partial(translate_item_directed, direction=direction)
+    if db and (direction or preserve):
+        raise ValueError("the persistent cache only holds default per-item translations")
+    if db:
+        translate = PersistentCache(db)
+        util.Finalize(translate, translate.close, exitpriority=10)
+    translate_item = TranslationCache(size, policy, translate, fold_case=not preserve) if size else translate
+    return translate_item
+
+def translate_line(line):
+    item = clean_tail_punct(line)
+    if not item:
+        return item
+    return translate_item(item)
+
+def translate_lines(lines):
+    if watcher is not None:
+        watcher.maybe_check()
+    if preserve_spans:
+        return [translate_item(x) if x.strip() else x for x in lines]
+    if engine.PROFILE is not None:
+        items = [clean_tail_punct(x) for x in lines]
+        engine.PROFILE.count_requests(sum(1 for x in items if x))
+        return [translate_item(x) if x else x for x in items]
+    if not cache_chain(translate_item):
+        return translate_batch([clean_tail_punct(x) for x in lines], document_direction)
+    return [translate_line(x) for x in lines]
+
+def profile_lines(lines):
+    out = translate_lines(lines)
+    return out, engine.PROFILE.take()
+
+def worker_compact():
+    # forked workers inherit the parent's tables; spawned ones load the lexicon on import and compact their own copy
+    return get_start_method() != "fork" and isinstance(engine.NORM_PT_EN, CompactTable)
+
+def use_compact_lexicon():
+    engine.install_lexicon(engine.LEXICON_VERSION, compact_lexicon(engine.LEXICON))
+
+def cache_chain(translate):
+    caches = []
+    while isinstance(translate, (TranslationCache, PersistentCache)):
+        caches.append(translate)
+        translate = translate.translate
+    return caches
+
+def watch_lexicon(interval):
+    global watcher
+    watcher = LexiconManager(caches=cache_chain(translate_item), interval=interval)
+    return watcher
+
+def init_worker(compact=False, cache_size=0, cache_policy="lru", cache_db=None, watch=0, direction=None, profile=False,
+                preserve=False, fuzzy=0):
+    if compact:
+        use_compact_lexicon()
+    engine.FUZZY_DISTANCE = fuzzy
+    set_cache(cache_size, cache_policy, cache_db, direction, preserve, compiled=not profile and not watch)
+    if profile:
+        Profile().enable()
+    if watch:
+        watch_lexicon(watch)
+
+def make_pool(workers=None, cache_size=0, cache_policy="lru", cache_db=None, direction=None, profile=False,
+              preserve=False):
+    return Pool(workers or os.cpu_count(), initializer=init_worker,
+                initargs=(worker_compact(), cache_size, cache_policy, cache_db, 0, direction, profile, preserve,
+                          engine.FUZZY_DISTANCE))
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def pool_translate(pool, items, chunk_size=500, profile=None):
+    out = []
+    if profile is None:
+        for part in pool.imap(translate_lines, chunked(items, chunk_size)):
+            out.extend(part)
+        return out
+    for part, snap in pool.imap(profile_lines, chunked(items, chunk_size)):
+        out.extend(part)
+        profile.merge(snap)
+    return out
+
+def translate_parallel(items, workers=None, chunk_size=500, cache_size=0, cache_db=None, direction=None):
+    items = list(items)
+    with make_pool(workers, cache_size, cache_db=cache_db, direction=direction) as pool:
+        return pool_translate(pool, items, chunk_size)
+
+def parse_columns(spec):
+    if not spec:
+        return None
+    cols = []
+    for c in spec.split(","):
+        c = c.strip()
+        if c:
+            cols.append(int(c) if c.isdigit() else c)
+    return cols
+
+def text_records(fin, columns, header):
+    for line in fin:
+        yield None, [line.rstrip("\r\n")]
+
+def csv_records(fin, columns, header):
+    reader = csv.reader(fin)
+    names = next(reader, None) if header else None
+    if names is not None:
+        yield names, None
+    idx = None
+    for row in reader:
+        if idx is None:
+            if columns is None:
+                idx = list(range(len(row)))
+            else:
+                idx = []
+                for c in columns:
+                    if isinstance(c, int):
+                        idx.append(c)
+                    elif names is not None and c in names:
+                        idx.append(names.index(c))
+                    else:
+                        raise SystemExit(f"Unknown CSV column: {c}")
+        yield (row, idx), [row[i] if i < len(row) else "" for i in idx]
+
+def jsonl_records(fin, columns, header):
+    for n, line in enumerate(fin, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            obj = None
+        if not isinstance(obj, dict):
+            print(f"Line {n}: not a JSON object, copied unchanged", file=sys.stderr)
+            yield line, None
+            continue
+        if columns is None:
+            keys = [k for k, v in obj.items() if isinstance(v, str)]
+        else:
+            keys = [k for k in columns if isinstance(obj.get(k), str)]
+        yield (obj, keys), [obj[k] for k in keys]
+
+def make_writer(fmt, fout):
+    if fmt == "text":
+        def write(rec, values):
+            fout.write(values[0] + "\n")
+        return write
+    if fmt == "csv":
+        writer = csv.writer(fout, lineterminator="\n")
+        def write(rec, values):
+            if values is None:
+                writer.writerow(rec)
+                return
+            row, idx = rec
+            for i, v in zip(idx, values):
+                if i < len(row):
+                    row[i] = v
+            writer.writerow(row)
+        return write
+    def write(rec, values):
+        if values is None:
+            fout.write(rec + "\n")
+            return
+        obj, keys = rec
+        for k, v in zip(keys, values):
+            obj[k] = v
+        fout.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    return write
+
+READERS = {"text": text_records, "csv": csv_records, "jsonl": jsonl_records}
+
+def run(fin, fout, fmt="text", columns=None, header=True, batch_size=1000,
+        translate_batch=translate_lines):
+    write = make_writer(fmt, fout)
+    records = READERS[fmt](fin, columns, header)
+    count = 0
+    while True:
+        batch = []
+        texts = []
+        for rec, values in records:
+            batch.append((rec, values))
+            if values:
+                texts.extend(values)
+            if len(batch) >= batch_size:
+                break
+        if not batch:
+            break
+        out = iter(translate_batch(texts)) if texts else iter(())
+        count += sum(1 for t in texts if clean_tail_punct(t))
+        for rec, values in batch:
+            if values is None:
+                write(rec, None)
+            else:
+                write(rec, [next(out) for _ in values])
+        fout.flush()
+    return count
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Translate a whole menu file (PT <-> EN), streaming line by line.")
+    ap.add_argument("input", nargs="?", default="-", help="input file (default: stdin)")
+    ap.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    ap.add_argument("-f", "--format", choices=FORMATS, default="text")
+    ap.add_argument("-c", "--columns", help="CSV columns (names or 0-based indices) or JSONL keys to translate, comma separated")
+    ap.add_argument("--no-header", action="store_true", help="CSV input has no header row")
+    ap.add_argument("--batch-size", type=int, default=1000, help="records buffered per write (default: 1000)")
+    ap.add_argument("-j", "--workers", type=int, default=1, help="worker processes (0 = one per CPU, default: 1)")
+    ap.add_argument("--chunk-size", type=int, default=500, help="items sent to a worker per task (default: 500)")
+    ap.add_argument("--cache-size", type=int, default=100000, help="translations memoized per process (0 = off, default: 100000)")
+    ap.add_argument("--cache-policy", choices=("lru", "fifo"), default="lru", help="cache eviction policy (default: lru)")
+    ap.add_argument("--cache-db", help="SQLite file for a persistent cache shared across runs and workers")
+    ap.add_argument("--detect", choices=("item", "document"), default="item",
+                    help="detect the language of each item, or once for the whole file from a sample of its first batch (default: item)")
+    ap.add_argument("--sample-size", type=int, default=engine.DOC_SAMPLE_SIZE,
+                    help="items scored with --detect document (default: %(default)s)")
+    ap.add_argument("--confidence", type=float, default=engine.DOC_CONFIDENCE,
+                    help="below this share of the sampled evidence, fall back to per-item detection (default: %(default)s)")
+    ap.add_argument("--preserve", action="store_true",
+                    help="rewrite only the translated words and phrases; punctuation, prices and spacing stay exactly as in the input")
+    ap.add_argument("--fuzzy", type=int, default=0, metavar="DISTANCE",
+                    help="translate a word missing from the lexicon as the closest lexicon word within DISTANCE edits (default: 0 = off)")
+    ap.add_argument("--manifest", metavar="FILE",
+                    help="remember each item's translation in FILE and only translate items that are new, edited or touched by a lexicon change")
+    ap.add_argument("--compact", action="store_true",
+                    help="keep the lexicon as interned IDs in packed arrays: less memory per process, slower lookups")
+    ap.add_argument("--shared-lexicon", action="store_true",
+                    help="put the lexicon in shared memory once; -j workers attach to it instead of loading their own copy")
+    ap.add_argument("--profile", choices=PROFILE_FORMATS,
+                    help="time each translation stage and count phrase hits, lexicon misses, plural fallbacks and cache hits")
+    ap.add_argument("--profile-output", default="-", help="where to write the --profile report (default: stderr)")
+    ap.add_argument("-q", "--quiet", action="store_true", help="do not report throughput")
+    args = ap.parse_args(argv)
+    if args.detect == "document" and args.cache_db:
+        ap.error("--cache-db only works with --detect item")
+    if args.preserve and args.cache_db:
+        ap.error("--cache-db cannot be combined with --preserve")
+    if args.fuzzy and args.cache_db:
+        ap.error("--cache-db cannot be combined with --fuzzy")
+    if args.manifest and args.profile:
+        ap.error("--manifest cannot be combined with --profile")
+
+    newline = "" if args.format == "csv" else None
+    if args.input == "-":
+        sys.stdin.reconfigure(encoding="utf-8")
+        fin = sys.stdin
+    else:
+        fin = open(args.input, encoding="utf-8", newline=newline)
+    if args.output == "-":
+        sys.stdout.reconfigure(encoding="utf-8")
+        fout = sys.stdout
+    else:
+        fout = open(args.output, "w", encoding="utf-8", newline=newline)
+
+    if args.compact:
+        use_compact_lexicon()
+    shared = share_lexicon() if args.shared_lexicon else None
+    engine.FUZZY_DISTANCE = max(0, args.fuzzy)
+    if engine.FUZZY_DISTANCE:
+        for direction in ("pt_en", "en_pt"):
+            engine.fuzzy_index(direction)
+    pool = None
+    cache = None
+    translate = None
+    profile = Profile() if args.profile else None
+    manifest = Manifest(args.manifest, fold_case=not args.preserve) if args.manifest else None
+    batch_size = max(1, args.batch_size)
+    workers = args.workers or os.cpu_count()
+    chunk_size = max(1, args.chunk_size)
+    if workers > 1:
+        batch_size = max(batch_size, chunk_size * workers * 4)
+
+    def translate_batch(texts):
+        nonlocal pool, cache, translate
+        if translate is None:
+            direction = None
+            if args.detect == "document":
+                direction, confidence = engine.detect_document(texts, args.sample_size)
+                if not args.quiet:
+                    print(f"Document direction: {direction} (confidence {confidence:.0%})", file=sys.stderr)
+                if confidence < args.confidence:
+                    direction = None
+            if workers > 1:
+                pool = make_pool(workers, args.cache_size, args.cache_policy, args.cache_db, direction, profile is not None,
+                                 args.preserve)
+                translate = lambda texts: pool_translate(pool, texts, chunk_size, profile)
+            else:
+                cache = set_cache(args.cache_size, args.cache_policy, args.cache_db, direction, args.preserve,
+                                  compiled=profile is None)
+                if profile is not None:
+                    profile.enable()
+                translate = translate_lines
+            if manifest is not None:
+                manifest.prepare(detect=args.detect, direction=direction, preserve=args.preserve)
+        if manifest is not None:
+            return manifest.translate(texts, translate)
+        return translate(texts)
+
+    start = time.perf_counter()
+    try:
+        count = run(fin, fout, args.format, parse_columns(args.columns),
+                    not args.no_header, batch_size, translate_batch)
+        if manifest is not None and manifest.stale is not None:
+            manifest.save()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if profile is not None:
+            profile.disable()
+        if shared is not None:
+            unshare_lexicon(shared)
+        db = getattr(cache, "translate", cache)
+        if isinstance(db, PersistentCache):
+            db.close()
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+    elapsed = time.perf_counter() - start
+
+    if not args.quiet:
+        rate = count / elapsed if elapsed > 0 else 0.0
+        print(f"Translated {count} items in {elapsed:.2f}s ({rate:,.0f} items/s)", file=sys.stderr)
+        if isinstance(cache, TranslationCache):
+            st = cache.stats()
+            print(f"Cache: {st['hits']} hits, {st['misses']} misses, {st['evictions']} evictions "
+                  f"({st['hit_rate']:.1%} hit rate)", file=sys.stderr)
+            cache = cache.translate
+        if manifest is not None:
+            st = manifest.stats()
+            print(f"Manifest: {st['items']} distinct items, {st['reused']} reused, {st['translated']} translated "
+                  f"({st['affected']} after a lexicon change, {st['restarted']} after a settings change)", file=sys.stderr)
+        if isinstance(cache, PersistentCache):
+            st = cache.stats()
+            print(f"Cache db: {st['hits']} hits, {st['misses']} misses "
+                  f"({st['hit_rate']:.1%} hit rate, lexicon {st['version']})", file=sys.stderr)
+    if profile is not None:
+        report = export(profile, args.profile)
+        if args.profile_output == "-":
+            sys.stderr.write(report)
+        else:
+            with open(args.profile_output, "w", encoding="utf-8") as fh:
+                fh.write(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import level4_menu_translator as engine
+from menu_batch import make_pool, pool_translate, translate_lines
+from menu_storage import COMPACT_TABLES, compact_lexicon
+
+CASINGS = (str.lower, str.lower, str.lower, str.upper, str.title)
+LEVELS = (1, 2, 3, 4)
+REGRESSION_THRESHOLD = 0.10
+
+def synthetic_menu(n, phrase_density=0.3, seed=0):
+    rnd = random.Random(seed)
+    vocab = {
+        "pt": (list(engine.PT_EN), list(engine.PHRASES_PT_EN)),
+        "en": (list(engine.EN_PT), list(engine.PHRASES_EN_PT)),
+    }
+    items = []
+    for _ in range(n):
+        words, phrases = vocab[rnd.choice(("pt", "en"))]
+        parts = []
+        for _ in range(rnd.randint(1, 4)):
+            if rnd.random() < phrase_density:
+                parts.append(rnd.choice(phrases))
+            else:
+                parts.append(rnd.choice(words))
+        item = rnd.choice((" ", ", ")).join(parts)
+        items.append(rnd.choice(CASINGS)(item))
+    return items
+
+def unknown_words(lines):
+    known = (engine.NORM_PT_EN, engine.NORM_EN_PT, engine.PLURAL_PT_EN, engine.PLURAL_EN_PT)
+    words = {w for line in lines for w in engine.normalize(line).split()}
+    return sorted(w for w in words if len(w) > 2 and not any(w in t for t in known))
+
+def labeled_menu(n, phrase_density=0.3, unknown_rate=0.3, seed=0):
+    rnd = random.Random(seed)
+    sources = engine.load_sources(engine.source_files(engine.LEXICON_DIR))
+    train = {}
+    vocab = {}
+    for lang, words, phrases in (
+        ("pt", list(engine.PT_EN), list(engine.PHRASES_PT_EN)),
+        ("en", list(engine.EN_PT), list(engine.PHRASES_EN_PT)),
+    ):
+        lines = sources["NGRAM_" + lang.upper()]
+        train[lang] = lines[::2]
+        vocab[lang] = words, phrases, unknown_words(lines[1::2])
+    items = []
+    labels = []
+    for _ in range(n):
+        lang = rnd.choice(("pt", "en"))
+        words, phrases, unknown = vocab[lang]
+        parts = []
+        for _ in range(rnd.randint(1, 4)):
+            r = rnd.random()
+            if r < unknown_rate:
+                parts.append(rnd.choice(unknown))
+            elif r < unknown_rate + phrase_density:
+                parts.append(rnd.choice(phrases))
+            else:
+                parts.append(rnd.choice(words))
+        item = rnd.choice((" ", ", ")).join(parts)
+        items.append(rnd.choice(CASINGS)(item))
+        labels.append("pt_en" if lang == "pt" else "en_pt")
+    return items, labels, engine.build_trigrams(train["pt"], train["en"])
+
+def bench_detect(items, labels, trigrams, repeat):
+    detectors = {
+        "counts": lambda item: engine.detect_direction_counts(engine.tokenize(item)),
+        "trigrams": engine.detect_direction,
+    }
+    saved = engine.TRIGRAMS
+    engine.TRIGRAMS = trigrams
+    try:
+        print(f"{'detector':<12} {'accuracy':>9} {'items/s':>12} {'p50 us':>8} {'p99 us':>8}")
+        for name, fn in detectors.items():
+            correct = sum(fn(item) == label for item, label in zip(items, labels))
+            r = time_function(fn, items, repeat)
+            print(f"{name:<12} {correct / len(items):>9.2%} {r['items_per_s']:>12,.0f} {r['p50_us']:>8.2f} {r['p99_us']:>8.2f}")
+    finally:
+        engine.TRIGRAMS = saved
+
+SYLLABLES = ("ba", "ca", "de", "fi", "go", "lu", "ma", "ne", "pi", "ro", "sa", "te", "vi", "zo", "lha", "nho", "qui")
+
+def synthetic_sources(entries, phrases, seed=0):
+    rnd = random.Random(seed)
+    def word():
+        return "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+    words = [engine.make_entry([word(), word(), "noun"]) for _ in range(entries)]
+    return {
+        "PT_EN": words,
+        "PHRASES_PT_EN": [engine.make_entry([" ".join(rnd.choice(words).pt for _ in range(rnd.randint(2, 3))),
+                                             " ".join(rnd.choice(words).en for _ in range(2))]) for _ in range(phrases)],
+        "UNCOUNTABLE_EN": set(),
+        "UNCOUNTABLE_PT": set(),
+        "NGRAM_PT": [],
+        "NGRAM_EN": [],
+    }
+
+def traced_size():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+def bench_memory(entries, phrases, seed, lookups=200000):
+    tracemalloc.start()
+    base = traced_size()
+    sources = synthetic_sources(entries, phrases, seed)
+    tables = engine.build_lexicon(sources)
+    del sources
+    dict_size = traced_size() - base
+    compact = compact_lexicon(tables)
+    keys = random.Random(seed).choices(list(tables["NORM_PT_EN"]), k=lookups)
+    del tables
+    compact_size = traced_size() - base
+    tracemalloc.stop()
+    plain = {"NORM_PT_EN": dict(compact["NORM_PT_EN"].items())}
+    print(f"{entries:,} words, {phrases:,} phrases, {len(compact)} tables ({len(COMPACT_TABLES)} compacted)")
+    print(f"{'form':<8} {'memory MiB':>11} {'lookups/s':>12}")
+    for form, size, t in (("dict", dict_size, plain), ("compact", compact_size, compact)):
+        get = t["NORM_PT_EN"].get
+        start = time.perf_counter()
+        for k in keys:
+            get(k)
+        rate = len(keys) / (time.perf_counter() - start)
+        print(f"{form:<8} {size / 2**20:>11.1f} {rate:>12,.0f}")
+
+CHECK_CASES = (
+    ("principais", "main"),
+    ("Principais", "Main"),
+    ("mains", "mains"),
+    ("pratos principais", "main courses"),
+    ("PRATOS PRINCIPAIS", "MAIN COURSES"),
+    ("main courses", "pratos principais"),
+)
+
+def check_cases(cases=CHECK_CASES):
+    failures = []
+    for item, want in cases:
+        got = engine.translate_item_auto(item)
+        if got != want:
+            failures.append((item, got, want))
+    print(f"{len(cases)} translation cases, {len(failures)} failure(s)")
+    for item, got, want in failures:
+        print(f"  {item!r}: got {got!r}, expected {want!r}")
+    return len(failures)
+
+SPAN_CASES = ("pão-de-queijo", "X-Salada", "frango/peixe", "batata-doce", "d'água", "Coca-Cola", "McDonald's")
+
+def check_spans(items):
+    failures = []
+    for item in items:
+        got = engine.translate_spans(item).text
+        want = engine.translate_item_auto(item)
+        if got != want:
+            failures.append((item, got, want))
+    print(f"{len(items)} items through translate_spans, {len(failures)} differ from translate_item_auto")
+    for item, got, want in failures[:10]:
+        print(f"  {item!r}: spans {got!r}, plain {want!r}")
+    return len(failures)
+
+def span_corpus(n, seed=0):
+    # translate_item_auto leaves a word with a comma glued to it alone, so the menu is split at commas
+    parts = {" ".join(p.split()) for x in synthetic_menu(n, seed=seed) for p in x.split(",")}
+    return sorted(parts - {""}) + list(SPAN_CASES)
+
+NORMALIZE_CONTEXTS = (("", ""), ("a", "b"), ("Ção ", " É"), ("σ", "ς"))
+
+def check_normalize(contexts=NORMALIZE_CONTEXTS, show=10):
+    start = time.perf_counter()
+    mismatches = []
+    for cp in range(sys.maxunicode + 1):
+        c = chr(cp)
+        for pre, post in contexts:
+            s = pre + c + post
+            got = engine.normalize(s)
+            want = engine.normalize_nfkd(s)
+            if got != want:
+                mismatches.append((s, got, want))
+    elapsed = time.perf_counter() - start
+    print(f"{sys.maxunicode + 1:,} code points x {len(contexts)} contexts checked in {elapsed:.1f}s, "
+          f"{len(mismatches):,} mismatch(es) with normalize_nfkd")
+    for s, got, want in mismatches[:show]:
+        print(f"  {s!r}: normalize {got!r}, normalize_nfkd {want!r}")
+    return len(mismatches)
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+def misspell(word, rnd):
+    i = rnd.randrange(len(word))
+    op = rnd.randrange(4)
+    if op == 0:
+        return word[:i] + word[i + 1:]
+    if op == 1:
+        return word[:i] + rnd.choice(LETTERS) + word[i:]
+    if op == 2:
+        return word[:i] + rnd.choice(LETTERS.replace(word[i], "")) + word[i + 1:]
+    i = min(i, len(word) - 2)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+def linear_scan(word, keys, distance):
+    best = None
+    for key in keys:
+        dist = engine.edit_distance(word, key, distance)
+        if dist <= distance and (best is None or (dist, key) < best):
+            best = dist, key
+            distance = dist
+    return None if best is None else best[1]
+
+def bench_fuzzy(words, distance, entries, seed, scan_limit=100):
+    rnd = random.Random(seed)
+    if entries:
+        keys = sorted({"".join(rnd.choice(LETTERS) for _ in range(rnd.randint(4, 12))) for _ in range(entries)})
+    else:
+        keys = engine.fuzzy_keys(engine.NORM_PT_EN, engine.PLURAL_PT_EN)
+    targets = rnd.choices(keys, k=words)
+    queries = [misspell(t, rnd) for t in targets]
+    for _ in range(distance - 1):
+        queries = [misspell(q, rnd) if len(q) > 1 else q for q in queries]
+    start = time.perf_counter()
+    index = engine.DeletionIndex(keys, distance)
+    build = time.perf_counter() - start
+    print(f"{len(keys):,} keys, {len(index.index):,} index entries, built in {build:.2f}s, max distance {distance}")
+    print(f"{'method':<8} {'words/s':>12} {'us/word':>9} {'corrected':>10}")
+    scanned = queries[:scan_limit]
+    results = {}
+    for name, fn, qs in (("index", index.lookup, queries),
+                         ("linear", lambda q: linear_scan(q, keys, distance), scanned)):
+        start = time.perf_counter()
+        found = [fn(q) for q in qs]
+        elapsed = time.perf_counter() - start
+        results[name] = found
+        fixed = sum(f == t for f, t in zip(found, targets))
+        print(f"{name:<8} {len(qs) / elapsed:>12,.0f} {elapsed / len(qs) * 1e6:>9.1f} {fixed / len(qs):>10.1%}")
+    same = sum(a == b for a, b in zip(results["index"], results["linear"]))
+    print(f"same answer on {same / len(scanned):.1%} of the first {len(scanned):,} words")
+
+def bench_parallel(items, max_workers, chunk_size):
+    print(f"{'workers':>7} {'seconds':>9} {'items/s':>12} {'speedup':>8}")
+    counts = [1 << i for i in range(max_workers.bit_length()) if 1 << i < max_workers] + [max_workers]
+    base = None
+    for workers in counts:
+        if workers == 1:
+            start = time.perf_counter()
+            translate_lines(items)
+            elapsed = time.perf_counter() - start
+        else:
+            with make_pool(workers) as pool:
+                pool_translate(pool, items[:workers * chunk_size], chunk_size)
+                start = time.perf_counter()
+                pool_translate(pool, items, chunk_size)
+                elapsed = time.perf_counter() - start
+        base = base or elapsed
+        print(f"{workers:>7} {elapsed:>9.3f} {len(items) / elapsed:>12,.0f} {base / elapsed:>7.2f}x")
+
+def level_functions(level):
+    m = importlib.import_module(f"level{level}_menu_translator")
+    if level == 1:
+        return {"normalize": m.normalize, "translate_item": m.translate_item}
+    if level == 2:
+        return {"normalize": m.normalize, "replace_phrases": m.replace_phrases, "translate_item": m.translate_item}
+    if level == 3:
+        return {
+            "normalize": m.normalize,
+            "replace_phrases": lambda s: m.replace_phrases(s, m.NORM_PH_PT_EN),
+            "detect_direction": m.detect_direction,
+            "translate_tokens_pt_en": lambda s: m.translate_tokens(s, m.NORM_PT_EN),
+            "translate_tokens_en_pt": lambda s: m.translate_tokens(s, m.NORM_EN_PT, reverse=True),
+            "translate_item_auto": m.translate_item_auto,
+        }
+    return {
+        "normalize": m.normalize,
+        "replace_phrases": lambda s: m.replace_phrases(s, m.NORM_PH_PT_EN),
+        "detect_direction": m.detect_direction,
+        "translate_tokens_pt_en": m.translate_tokens_pt_en,
+        "translate_tokens_en_pt": m.translate_tokens_en_pt,
+        "translate_item_auto": m.translate_item_auto,
+        "AutoTranslator": m.AutoTranslator().translate,
+    }
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def time_function(fn, items, repeat):
+    best = None
+    for _ in range(repeat):
+        lat = []
+        clock = time.perf_counter_ns
+        start = clock()
+        for item in items:
+            t = clock()
+            fn(item)
+            lat.append(clock() - t)
+        total = clock() - start
+        if best is None or total < best[0]:
+            best = total, lat
+    total, lat = best
+    lat.sort()
+    tracemalloc.start()
+    for item in items:
+        fn(item)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "items_per_s": len(items) / (total / 1e9),
+        "p50_us": percentile(lat, 0.50) / 1e3,
+        "p99_us": percentile(lat, 0.99) / 1e3,
+        "peak_kib": peak / 1024,
+    }
+
+def bench_functions(items, levels, repeat, only=None):
+    results = {}
+    for level in levels:
+        for name, fn in level_functions(level).items():
+            if only and name not in only:
+                continue
+            fn(items[0])
+            results[f"level{level}.{name}"] = time_function(fn, items, repeat)
+    return results
+
+def print_results(results):
+    print(f"{'benchmark':<32} {'items/s':>12} {'p50 us':>8} {'p99 us':>8} {'peak KiB':>9}")
+    for name, r in results.items():
+        print(f"{name:<32} {r['items_per_s']:>12,.0f} {r['p50_us']:>8.2f} {r['p99_us']:>8.2f} {r['peak_kib']:>9.1f}")
+
+def compare_runs(base, new, threshold=REGRESSION_THRESHOLD):
+    print(f"{'benchmark':<32} {'base/s':>12} {'new/s':>12} {'change':>8} {'p99 change':>10}")
+    regressions = []
+    for name, r in new["results"].items():
+        b = base["results"].get(name)
+        if b is None:
+            print(f"{name:<32} {'-':>12} {r['items_per_s']:>12,.0f} {'new':>8}")
+            continue
+        speed = r["items_per_s"] / b["items_per_s"] - 1
+        tail = r["p99_us"] / b["p99_us"] - 1 if b["p99_us"] else 0.0
+        flag = ""
+        if speed < -threshold or tail > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<32} {b['items_per_s']:>12,.0f} {r['items_per_s']:>12,.0f} {speed:>+8.1%} {tail:>+10.1%}{flag}")
+    return regressions
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Menu translator benchmarks.")
+    sub = ap.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("parallel", help="scaling of the process-pool batch translation from 1 to N workers")
+    p.add_argument("--items", type=int, default=100000)
+    p.add_argument("--phrase-density", type=float, default=0.3)
+    p.add_argument("--max-workers", type=int, default=os.cpu_count())
+    p.add_argument("--chunk-size", type=int, default=500)
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("functions", help="throughput, latency and peak memory of the hot functions of each level")
+    p.add_argument("--items", type=int, default=20000)
+    p.add_argument("--phrase-density", type=float, default=0.3)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--levels", default="1,2,3,4", help="comma separated levels (default: 1,2,3,4)")
+    p.add_argument("--only", help="comma separated function names to run")
+    p.add_argument("--repeat", type=int, default=3, help="timed passes per function, the fastest is kept (default: 3)")
+    p.add_argument("--json", help="also save the results to this file (input for compare)")
+
+    p = sub.add_parser("detect", help="accuracy and latency of the language detector against plain lexicon counting")
+    p.add_argument("--items", type=int, default=20000)
+    p.add_argument("--phrase-density", type=float, default=0.3)
+    p.add_argument("--unknown-rate", type=float, default=0.3, help="share of words missing from the lexicon (default: 0.3)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--repeat", type=int, default=3)
+
+    p = sub.add_parser("memory", help="memory of the lookup tables as dicts and in compact form, on a synthetic lexicon")
+    p.add_argument("--entries", type=int, default=200000, help="glossary rows (default: 200000)")
+    p.add_argument("--phrases", type=int, default=50000, help="phrase rows (default: 50000)")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("fuzzy", help="misspelled-word correction with the deletion index against a linear scan")
+    p.add_argument("--words", type=int, default=5000, help="misspelled words to correct (default: 5000)")
+    p.add_argument("--distance", type=int, default=1, help="edits per word and max distance (default: 1)")
+    p.add_argument("--entries", type=int, default=0, help="use this many random words instead of the lexicon")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("check", help="translate known cases, and check that translate_spans agrees with translate_item_auto")
+    p.add_argument("--items", type=int, default=20000, help="synthetic menu items for the span check (default: 20000)")
+    p.add_argument("--seed", type=int, default=0)
+
+    p = sub.add_parser("normalize", help="check normalize against the NFKD reference for every code point")
+    p.add_argument("--show", type=int, default=10, help="mismatches to print (default: 10)")
+
+    p = sub.add_parser("compare", help="compare two saved runs and flag regressions")
+    p.add_argument("base")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                   help="relative items/s drop or p99 rise that counts as a regression (default: %(default)s)")
+
+    args = ap.parse_args(argv)
+    if args.bench == "compare":
+        with open(args.base, encoding="utf-8") as fh:
+            base = json.load(fh)
+        with open(args.new, encoding="utf-8") as fh:
+            new = json.load(fh)
+        regressions = compare_runs(base, new, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+            return 1
+        return 0
+    if args.bench == "check":
+        failures = check_cases()
+        failures += check_spans(span_corpus(args.items, args.seed))
+        return 1 if failures else 0
+    if args.bench == "normalize":
+        return 1 if check_normalize(show=args.show) else 0
+    if args.bench == "memory":
+        bench_memory(args.entries, args.phrases, args.seed)
+        return 0
+    if args.bench == "fuzzy":
+        bench_fuzzy(args.words, max(1, args.distance), args.entries, args.seed)
+        return 0
+    if args.bench == "detect":
+        items, labels, trigrams = labeled_menu(args.items, args.phrase_density, args.unknown_rate, args.seed)
+        bench_detect(items, labels, trigrams, max(1, args.repeat))
+        return 0
+    items = synthetic_menu(args.items, args.phrase_density, args.seed)
+    if args.bench == "parallel":
+        bench_parallel(items, max(1, args.max_workers), max(1, args.chunk_size))
+    elif args.bench == "functions":
+        levels = [int(x) for x in args.levels.split(",") if x.strip()]
+        only = {x.strip() for x in args.only.split(",")} if args.only else None
+        results = bench_functions(items, levels, max(1, args.repeat), only)
+        print_results(results)
+        if args.json:
+            run = {
+                "python": platform.python_version(),
+                "lexicon": engine.LEXICON_VERSION,
+                "items": args.items,
+                "phrase_density": args.phrase_density,
+                "seed": args.seed,
+                "results": results,
+            }
+            with open(args.json, "w", encoding="utf-8") as fh:
+                json.dump(run, fh, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
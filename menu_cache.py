@@ -0,0 +1,154 @@
+import hashlib
+import sqlite3
+from collections import OrderedDict
+
+import level4_menu_translator as engine
+from level4_menu_translator import casing_key, match_casing, translate_item_auto
+
+def lexicon_version():
+    h = hashlib.sha256(engine.LEXICON_VERSION.encode("ascii"))
+    with open(engine.__file__, "rb") as fh:
+        h.update(fh.read())
+    return h.hexdigest()[:16]
+
+cache_key = casing_key
+
+class TranslationCache:
+    def __init__(self, maxsize=100000, policy="lru", translate=translate_item_auto, fold_case=True):
+        if policy not in ("lru", "fifo"):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.translate = translate
+        self.fold_case = fold_case
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __call__(self, item):
+        key, folded = cache_key(item) if self.fold_case else (item, False)
+        out = self.data.get(key)
+        if out is None:
+            self.misses += 1
+            out = self.translate(key)
+            self.data[key] = out
+            if self.maxsize is not None and len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.hits += 1
+            if self.policy == "lru":
+                self.data.move_to_end(key)
+        return match_casing(item, out) if folded else out
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        self.data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def invalidate(self, affected):
+        stale = [k for k in list(self.data) if affected(k)]
+        for k in stale:
+            self.data.pop(k, None)
+        return len(stale)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class PersistentCache:
+    def __init__(self, path, translate=translate_item_auto, version=None, flush_every=1000, timeout=30.0):
+        self.path = path
+        self.translate = translate
+        self.version = version or lexicon_version()
+        self.flush_every = flush_every
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "version TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (version, key)) WITHOUT ROWID"
+        )
+
+    def __call__(self, item):
+        key, folded = cache_key(item)
+        out = self.pending.get(key)
+        if out is None:
+            row = self.conn.execute(
+                "SELECT value FROM translations WHERE version = ? AND key = ?", (self.version, key)
+            ).fetchone()
+            out = row[0] if row is not None else None
+        if out is None:
+            self.misses += 1
+            out = self.translate(key)
+            self.pending[key] = out
+            if len(self.pending) >= self.flush_every:
+                self.flush()
+        else:
+            self.hits += 1
+        return match_casing(item, out) if folded else out
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO translations VALUES (?, ?, ?)",
+                [(self.version, k, v) for k, v in self.pending.items()],
+            )
+        self.pending = {}
+
+    def purge_stale(self):
+        self.flush()
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            cur = self.conn.execute("DELETE FROM translations WHERE version != ?", (self.version,))
+        return cur.rowcount
+
+    def rebase(self, affected, version=None):
+        self.flush()
+        old = self.version
+        version = version or lexicon_version()
+        if version == old:
+            return 0
+        rows = self.conn.execute("SELECT key, value FROM translations WHERE version = ?", (old,)).fetchall()
+        keep = [(version, k, v) for k, v in rows if not affected(k)]
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany("INSERT OR IGNORE INTO translations VALUES (?, ?, ?)", keep)
+        self.version = version
+        return len(rows) - len(keep)
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
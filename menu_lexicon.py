@@ -0,0 +1,373 @@
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import warnings
+
+import level4_menu_translator as engine
+from menu_storage import LEXICON_FORMAT, LEXICON_MAGIC, pack_lexicon
+
+SHARED_MEMORY_DIR = "/dev/shm"
+
+def compile_lexicon(path=engine.LEXICON_DIR, out=None):
+    files = engine.source_files(path)
+    if len(files) != len(engine.LEXICON_SOURCES):
+        missing = sorted(set(engine.LEXICON_SOURCES) - set(files))
+        raise FileNotFoundError(f"Lexicon sources not found in {path}: {', '.join(missing)}")
+    tables = engine.build_lexicon(engine.load_sources(files))
+    image = pack_lexicon(tables, engine.source_version(files), engine.source_fingerprint(files))
+    out = out or os.path.join(path, engine.COMPILED_LEXICON)
+    tmp = out + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(image)
+    os.replace(tmp, out)
+    return out
+
+def share_lexicon(tables=None, version=None, directory=None):
+    tables = engine.LEXICON if tables is None else tables
+    version = version or engine.LEXICON_VERSION
+    if directory is None and os.path.isdir(SHARED_MEMORY_DIR):
+        directory = SHARED_MEMORY_DIR
+    image = pack_lexicon(tables, version, engine.source_fingerprint(engine.source_files()))
+    fd, path = tempfile.mkstemp(prefix="menu-lexicon-", suffix=".bin", dir=directory)
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(image)
+    header, shared = engine.open_lexicon(path)
+    engine.install_lexicon(version, shared)
+    os.environ["MENU_LEXICON_SHARED"] = path
+    return path
+
+def unshare_lexicon(path):
+    if os.environ.get("MENU_LEXICON_SHARED") == path:
+        del os.environ["MENU_LEXICON_SHARED"]
+    os.unlink(path)
+
+WORD = re.compile(r"\w+")
+
+def copy_table(t):
+    if isinstance(t, engine.BiIndex):
+        return engine.BiIndex(dict(t.pt.items()), dict(t.en.items()))
+    if isinstance(t, (set, frozenset)):
+        return set(t)
+    return dict(t.items())
+
+class TableEdits(dict):
+    def __init__(self, tables):
+        super().__init__(tables)
+        self.copied = set()
+
+    def edit(self, name):
+        if name not in self.copied:
+            self[name] = copy_table(self[name])
+            self.copied.add(name)
+        return self[name]
+
+def entry_changes(old, new):
+    old_set = set(old)
+    new_set = set(new)
+    added = new_set - old_set
+    removed = old_set - new_set
+    moved = [e for e in old if e in new_set] != [e for e in new if e in old_set]
+    return added, removed, moved
+
+def first_positions(entries):
+    pos = {}
+    for i, e in enumerate(entries):
+        pos.setdefault(e, i)
+    return pos
+
+def update_index(index, pos, added, removed):
+    keys = ({engine.normalize(e.pt) for e in added | removed}, {engine.normalize(e.en) for e in added | removed})
+    for side, side_keys, field in ((index.pt, keys[0], 0), (index.en, keys[1], 1)):
+        fresh = {}
+        for e in added:
+            fresh.setdefault(engine.normalize(e[field]), []).append(e)
+        for k in side_keys:
+            cands = [e for e in side.get(k, ()) if e not in removed] + fresh.get(k, [])
+            if cands:
+                side[k] = tuple(sorted(cands, key=lambda e: (not e.pref, pos[e])))
+            else:
+                side.pop(k, None)
+    return keys
+
+def update_raw(raw, entries, changed, field_from, field_to):
+    first = {}
+    for e in entries:
+        first.setdefault(e[field_from], e[field_to])
+    for key in {e[field_from] for e in changed}:
+        if key in first:
+            raw[key] = first[key]
+        else:
+            raw.pop(key, None)
+
+def update_preferred(raw, norm, old_side, side, keys, src, dst):
+    for k in keys:
+        old = old_side.get(k)
+        if old:
+            raw.pop(getattr(old[0], src), None)
+        cands = side.get(k)
+        if cands:
+            raw[getattr(cands[0], src)] = getattr(cands[0], dst)
+            norm[k] = getattr(cands[0], dst)
+        else:
+            norm.pop(k, None)
+
+class PluralSources:
+    def __init__(self, side, forms_of):
+        self.forms_of = forms_of
+        self.key_forms = {}
+        self.sources = {}
+        for k, cands in side.items():
+            self.add(k, cands)
+
+    def add(self, k, cands):
+        forms = self.forms_of(k, cands) if engine.takes_plural(cands) else set()
+        self.key_forms[k] = forms
+        for f in forms:
+            self.sources.setdefault(f, set()).add(k)
+
+    def remove(self, k):
+        for f in self.key_forms.pop(k, ()):
+            keys = self.sources[f]
+            keys.discard(k)
+            if not keys:
+                del self.sources[f]
+
+    def update(self, side, keys):
+        affected = set(keys)
+        for k in keys:
+            affected |= self.key_forms.get(k, set())
+            self.remove(k)
+            cands = side.get(k)
+            if cands:
+                self.add(k, cands)
+                affected |= self.key_forms[k]
+        return affected
+
+def plural_forms_pt(k, cands):
+    return engine.plural_forms_pt(cands[0].pt)
+
+def plural_forms_en(k, cands):
+    return engine.plural_forms_en(k) if engine.takes_plural_en(cands) else set()
+
+class LexiconManager:
+    def __init__(self, path=engine.LEXICON_DIR, caches=(), interval=2.0):
+        self.path = path
+        self.caches = list(caches)
+        self.interval = interval
+        self.next_check = 0.0
+        self.reloads = 0
+        self.files = engine.source_files(path)
+        self.fingerprint = engine.source_fingerprint(self.files)
+        self.digests = {name: engine.source_digest(p) for name, p in self.files.items()}
+        self.sources = engine.load_sources(self.files)
+        version = engine.source_version(self.files, self.digests)
+        if version != engine.LEXICON_VERSION:
+            engine.install_lexicon(version, engine.build_lexicon(self.sources))
+        self.tables = engine.LEXICON
+        words = self.tables["WORDS"]
+        self.plural_pt = PluralSources(words.pt, plural_forms_pt)
+        self.plural_en = PluralSources(words.en, plural_forms_en)
+
+    def check(self):
+        files = engine.source_files(self.path)
+        fingerprint = engine.source_fingerprint(files)
+        if files == self.files and fingerprint == self.fingerprint:
+            return None
+        return self.reload(files, fingerprint)
+
+    def maybe_check(self):
+        now = time.monotonic()
+        if now < self.next_check:
+            return None
+        self.next_check = now + self.interval
+        try:
+            return self.check()
+        except (OSError, ValueError, IndexError) as exc:
+            warnings.warn(f"Lexicon reload failed: {exc}")
+            return None
+
+    def reload(self, files=None, fingerprint=None):
+        files = files or engine.source_files(self.path)
+        if len(files) != len(engine.LEXICON_SOURCES):
+            missing = sorted(set(engine.LEXICON_SOURCES) - set(files))
+            raise FileNotFoundError(f"Lexicon sources not found in {self.path}: {', '.join(missing)}")
+        fingerprint = fingerprint or engine.source_fingerprint(files)
+        digests = dict(self.digests)
+        for name, p in files.items():
+            if p != self.files.get(name) or fingerprint[name] != self.fingerprint.get(name):
+                digests[name] = engine.source_digest(p)
+        changed = {name: p for name, p in files.items() if digests[name] != self.digests.get(name)}
+        if not changed:
+            self.files = files
+            self.fingerprint = fingerprint
+            return None
+        new = dict(self.sources)
+        new.update(engine.load_sources(changed))
+        version = engine.source_version(files, digests)
+        retrained = self.sources["NGRAM_PT"] != new["NGRAM_PT"] or self.sources["NGRAM_EN"] != new["NGRAM_EN"]
+        tables, words, phrases = self.apply(new)
+        if retrained:
+            tables["TRIGRAMS"] = engine.build_trigrams(new["NGRAM_PT"], new["NGRAM_EN"])
+        engine.install_lexicon(version, tables)
+        self.tables = tables
+        self.sources = new
+        self.files = files
+        self.fingerprint = fingerprint
+        self.digests = digests
+        self.reloads += 1
+        invalidated = self.invalidate(words, phrases, everything=retrained)
+        return {"version": version, "words": len(words), "phrases": len(phrases), "invalidated": invalidated}
+
+    def apply(self, new):
+        old = self.sources
+        tables = TableEdits(self.tables)
+        changed_words = set()
+        changed_phrases = set()
+        for name, index_name, raw_name, rev_name, norm_name, rev_norm_name in (
+            ("PT_EN", "WORDS", "PT_EN", "EN_PT", "NORM_PT_EN", "NORM_EN_PT"),
+            ("PHRASES_PT_EN", "PHRASES", "PHRASES_PT_EN", "PHRASES_EN_PT", "NORM_PH_PT_EN", "NORM_PH_EN_PT"),
+        ):
+            if new[name] is old[name]:
+                continue
+            added, removed, moved = entry_changes(old[name], new[name])
+            if moved:
+                return self.rebuild(new)
+            if not added and not removed:
+                continue
+            index = tables.edit(index_name)
+            old_index = self.tables[index_name]
+            pt_keys, en_keys = update_index(index, first_positions(new[name]), added, removed)
+            update_raw(tables.edit(raw_name), new[name], added | removed, 0, 1)
+            norm = tables.edit(norm_name)
+            for k in pt_keys:
+                cands = index.pt.get(k)
+                if cands:
+                    norm[k] = cands[0].en
+                else:
+                    norm.pop(k, None)
+            update_preferred(tables.edit(rev_name), tables.edit(rev_norm_name), old_index.en, index.en, en_keys, "en", "pt")
+            changed = changed_words if index_name == "WORDS" else changed_phrases
+            changed |= pt_keys | en_keys
+            if index_name == "WORDS":
+                changed |= self.update_plurals(tables, new, pt_keys, en_keys)
+        if old["UNCOUNTABLE_EN"] != new["UNCOUNTABLE_EN"] or old["UNCOUNTABLE_PT"] != new["UNCOUNTABLE_PT"]:
+            tables["UNCOUNTABLE_EN"] = set(new["UNCOUNTABLE_EN"])
+            tables["UNCOUNTABLE_PT"] = set(new["UNCOUNTABLE_PT"])
+            old_plurals = set(tables["PLURAL_PT_EN"]) | set(tables["PLURAL_EN_PT"])
+            tables["PLURAL_PT_EN"], tables["PLURAL_EN_PT"] = engine.build_plurals(
+                tables["WORDS"], new["UNCOUNTABLE_EN"], new["UNCOUNTABLE_PT"])
+            changed_words |= old_plurals | set(tables["PLURAL_PT_EN"]) | set(tables["PLURAL_EN_PT"])
+        if changed_words:
+            word_lang = tables.edit("WORD_LANG")
+            for k in changed_words:
+                vote = engine.word_language(k, tables)
+                if vote is None:
+                    word_lang.pop(k, None)
+                else:
+                    word_lang[k] = vote
+        return dict(tables), changed_words, changed_phrases
+
+    def update_plurals(self, tables, new, pt_keys, en_keys):
+        words = tables["WORDS"]
+        pos = first_positions(new["PT_EN"])
+        uncountable_en = new["UNCOUNTABLE_EN"]
+        uncountable_pt = {engine.normalize(w) for w in new["UNCOUNTABLE_PT"]}
+        changed = set()
+        for sources, side, keys, table in (
+            (self.plural_pt, words.pt, pt_keys, tables.edit("PLURAL_PT_EN")),
+            (self.plural_en, words.en, en_keys, tables.edit("PLURAL_EN_PT")),
+        ):
+            for form in sources.update(side, keys):
+                producers = sources.sources.get(form)
+                if form in side or not producers:
+                    table.pop(form, None)
+                elif side is words.pt:
+                    k = min(producers, key=lambda k: (form != k + "s", min(pos[e] for e in side[k])))
+                    table[form] = engine.plural_en_of(side[k], uncountable_en)
+                else:
+                    k = min(producers, key=lambda k: min(pos[e] for e in side[k]))
+                    table[form] = engine.plural_pt_of(side[k], uncountable_pt)
+                changed.add(form)
+        return changed
+
+    def rebuild(self, new):
+        tables = engine.build_lexicon(new)
+        words = tables["WORDS"]
+        self.plural_pt = PluralSources(words.pt, plural_forms_pt)
+        self.plural_en = PluralSources(words.en, plural_forms_en)
+        changed = set()
+        for name in ("NORM_PT_EN", "NORM_EN_PT", "PLURAL_PT_EN", "PLURAL_EN_PT"):
+            old, cur = self.tables[name], tables[name]
+            changed |= {k for k in set(old) | set(cur) if old.get(k) != cur.get(k)}
+        phrases = set()
+        for name in ("NORM_PH_PT_EN", "NORM_PH_EN_PT"):
+            old, cur = self.tables[name], tables[name]
+            phrases |= {k for k in set(old) | set(cur) if old.get(k) != cur.get(k)}
+        return tables, changed, phrases
+
+    def invalidate(self, words, phrases, everything=False):
+        if not words and not phrases and not everything:
+            return 0
+        affected = affected_by(words, phrases, everything)
+        count = 0
+        for cache in self.caches:
+            if hasattr(cache, "rebase"):
+                count += cache.rebase(affected)
+            else:
+                count += cache.invalidate(affected)
+        return count
+
+def affected_by(words, phrases, everything=False):
+    def affected(item):
+        if everything:
+            return True
+        norm = engine.normalize(item)
+        if any(w in words for w in norm.split()) or any(w in words for w in WORD.findall(norm)):
+            return True
+        return any(p in norm for p in phrases)
+    return affected
+
+def check_lexicon(path=engine.LEXICON_DIR):
+    compiled = os.path.join(path, engine.COMPILED_LEXICON)
+    if not os.path.exists(compiled):
+        return f"{compiled} does not exist"
+    with open(compiled, "rb") as fh:
+        head = fh.read(12)
+        if head[:4] != LEXICON_MAGIC:
+            return f"{compiled} is not a compiled lexicon"
+        if int.from_bytes(head[4:8], "little") != LEXICON_FORMAT:
+            return f"{compiled} uses an old format"
+        header = json.loads(fh.read(int.from_bytes(head[8:12], "little")))
+    files = engine.source_files(path)
+    if header["byteorder"] != sys.byteorder:
+        return f"{compiled} was compiled on a {header['byteorder']}-endian machine"
+    if header["version"] != engine.source_version(files):
+        return "lexicon sources changed since the last compile"
+    if header["sources"] != engine.source_fingerprint(files):
+        return "lexicon source files were touched since the last compile"
+    return None
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compile the menu lexicon into its binary form, or check that it is up to date.")
+    ap.add_argument("command", choices=("compile", "check"))
+    ap.add_argument("-d", "--dir", default=engine.LEXICON_DIR, help="lexicon directory (default: %(default)s)")
+    ap.add_argument("-o", "--output", help=f"compiled file (default: <dir>/{engine.COMPILED_LEXICON})")
+    args = ap.parse_args(argv)
+
+    if args.command == "compile":
+        out = compile_lexicon(args.dir, args.output)
+        print(f"Compiled {out} ({os.path.getsize(out):,} bytes)")
+        return 0
+    problem = check_lexicon(args.dir)
+    if problem:
+        print(f"Stale: {problem}")
+        return 1
+    print("Up to date.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from menu_bench import percentile, synthetic_menu
+
+async def request(reader, writer, host, path, payload=None):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+    method = "POST" if payload is not None else "GET"
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        if k.strip().lower() == "content-length":
+            length = int(v)
+    return status, json.loads(await reader.readexactly(length))
+
+async def client(host, port, items, batch, state, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while state["sent"] < state["total"]:
+            i = state["sent"]
+            state["sent"] += 1
+            start = time.perf_counter()
+            if batch == 1:
+                status, _ = await request(reader, writer, host, "/translate", {"text": items[i % len(items)]})
+            else:
+                chunk = [items[(i * batch + k) % len(items)] for k in range(batch)]
+                status, _ = await request(reader, writer, host, "/translate/batch", {"items": chunk})
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                state["errors"] += 1
+    finally:
+        writer.close()
+
+async def wait_ready(host, port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+            continue
+        try:
+            await request(reader, writer, host, "/health")
+        finally:
+            writer.close()
+        return
+
+async def load_test(host, port, items, requests, connections, batch):
+    await wait_ready(host, port)
+    state = {"sent": 0, "total": requests, "errors": 0}
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, items, batch, state, latencies) for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"{len(latencies)} requests ({len(latencies) * batch} items) over {connections} connection(s) in {elapsed:.2f}s")
+    print(f"{len(latencies) / elapsed:,.0f} req/s, {len(latencies) * batch / elapsed:,.0f} items/s, {state['errors']} errors")
+    print(f"latency p50 {percentile(latencies, 0.50) * 1e3:.2f} ms, p99 {percentile(latencies, 0.99) * 1e3:.2f} ms")
+    return state["errors"]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Load test for menu_server.py, using keep-alive connections.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--requests", type=int, default=5000, help="total requests (default: 5000)")
+    ap.add_argument("-c", "--connections", type=int, default=16, help="concurrent connections (default: 16)")
+    ap.add_argument("--batch", type=int, default=1, help="items per request; above 1 uses /translate/batch (default: 1)")
+    ap.add_argument("--items", type=int, default=10000, help="size of the synthetic menu to draw from (default: 10000)")
+    ap.add_argument("--phrase-density", type=float, default=0.3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--spawn", action="store_true", help="start menu_server.py on --port for the duration of the test")
+    ap.add_argument("-j", "--workers", type=int, default=1, help="server worker processes with --spawn (default: 1)")
+    args = ap.parse_args(argv)
+
+    items = synthetic_menu(args.items, args.phrase_density, args.seed)
+    server = None
+    if args.spawn:
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "menu_server.py")
+        server = subprocess.Popen([sys.executable, script, "--host", args.host,
+                                   "--port", str(args.port), "-j", str(args.workers)])
+    try:
+        errors = asyncio.run(load_test(args.host, args.port, items, max(1, args.requests),
+                                       max(1, args.connections), max(1, args.batch)))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
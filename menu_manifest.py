@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import zlib
+
+import level4_menu_translator as engine
+from level4_menu_translator import casing_key, match_casing
+from menu_lexicon import affected_by
+
+MANIFEST_FORMAT = 1
+WORD_TABLES = ("NORM_PT_EN", "NORM_EN_PT", "PLURAL_PT_EN", "PLURAL_EN_PT", "WORD_LANG")
+PHRASE_TABLES = ("NORM_PH_PT_EN", "NORM_PH_EN_PT")
+
+def item_hash(key):
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def digest(values):
+    return zlib.crc32(json.dumps(values, ensure_ascii=False).encode("utf-8"))
+
+def entry_digests(names):
+    tables = [getattr(engine, name) for name in names]
+    keys = set()
+    for t in tables:
+        keys.update(t)
+    return {k: digest([t.get(k) for t in tables]) for k in sorted(keys)}
+
+def changed_keys(old, new):
+    return {k for k in old.keys() | new.keys() if old.get(k) != new.get(k)}
+
+def engine_hash():
+    with open(engine.__file__, "rb") as fh:
+        return hashlib.sha256(fh.read()).hexdigest()[:16]
+
+def run_settings(**settings):
+    return dict(settings, engine=engine_hash(), trigrams=digest(sorted(engine.TRIGRAMS.items())),
+                fuzzy=engine.FUZZY_DISTANCE)
+
+class Manifest:
+    def __init__(self, path, fold_case=True):
+        self.path = path
+        self.fold_case = fold_case
+        self.old = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                data = json.load(fh)
+            if data.get("format") == MANIFEST_FORMAT:
+                self.old = data
+        self.items = {}
+        self.stale = None
+        self.words = self.phrases = None
+        self.reused = 0
+        self.translated = 0
+        self.affected = 0
+        self.restarted = 0
+        self.restart = False
+
+    def prepare(self, **settings):
+        self.settings = run_settings(**settings)
+        old = self.old
+        if not old or old["settings"] != self.settings or (self.settings["fuzzy"] and old["lexicon"] != engine.LEXICON_VERSION):
+            # a new lexicon word can become the fuzzy match of any unknown word, so fuzzy runs start over
+            self.stale = lambda item: True
+            self.restart = True
+            return self
+        self.restart = False
+        if old["lexicon"] == engine.LEXICON_VERSION:
+            self.stale = lambda item: False
+            self.words, self.phrases = old["words"], old["phrases"]
+        else:
+            self.words = entry_digests(WORD_TABLES)
+            self.phrases = entry_digests(PHRASE_TABLES)
+            self.stale = affected_by(changed_keys(old["words"], self.words), changed_keys(old["phrases"], self.phrases))
+        return self
+
+    def translate(self, texts, translate):
+        previous = self.old.get("items", {})
+        items = self.items
+        keys = []
+        todo = {}
+        for text in texts:
+            key, folded = casing_key(text) if self.fold_case else (text, False)
+            h = item_hash(key)
+            keys.append((h, folded))
+            if h in items or h in todo:
+                continue
+            tr = previous.get(h)
+            if tr is not None and self.stale(key):
+                if self.restart:
+                    self.restarted += 1
+                else:
+                    self.affected += 1
+                tr = None
+            if tr is None:
+                todo[h] = key
+            else:
+                items[h] = tr
+                self.reused += 1
+        if todo:
+            self.translated += len(todo)
+            items.update(zip(todo, translate(list(todo.values()))))
+        return [match_casing(text, items[h]) if folded else items[h] for text, (h, folded) in zip(texts, keys)]
+
+    def save(self):
+        if self.words is None:
+            self.words = entry_digests(WORD_TABLES)
+            self.phrases = entry_digests(PHRASE_TABLES)
+        data = {
+            "format": MANIFEST_FORMAT,
+            "lexicon": engine.LEXICON_VERSION,
+            "settings": self.settings,
+            "words": self.words,
+            "phrases": self.phrases,
+            "items": self.items,
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def stats(self):
+        return {"reused": self.reused, "translated": self.translated, "affected": self.affected,
+                "restarted": self.restarted, "items": len(self.items)}
@@ -0,0 +1,84 @@
+import json
+
+import level4_menu_translator as engine
+
+STAGES = ("tokenize", "detect", "phrases", "lookup", "plurals", "fuzzy", "casing", "join", "total")
+COUNTERS = (
+    "requests", "items", "items_pt_en", "items_en_pt", "cache_hits",
+    "phrase_hits", "lexicon_hits", "lexicon_misses", "plural_fallbacks", "fuzzy_corrections",
+)
+FORMATS = ("table", "json", "prometheus")
+METRIC_PREFIX = "menu_translator"
+
+class Profile:
+    def __init__(self):
+        self.times = {}
+        self.counts = {}
+
+    def enable(self):
+        engine.PROFILE = self
+        return self
+
+    def disable(self):
+        if engine.PROFILE is self:
+            engine.PROFILE = None
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def count_requests(self, n):
+        self.counts["requests"] = self.counts.get("requests", 0) + n
+
+    def take(self):
+        snap = {"times": self.times, "counts": self.counts}
+        self.times = {}
+        self.counts = {}
+        return snap
+
+    def merge(self, snap):
+        for table, add in ((self.times, snap["times"]), (self.counts, snap["counts"])):
+            for k, v in add.items():
+                table[k] = table.get(k, 0) + v
+
+    def summary(self):
+        counts = {name: self.counts.get(name, 0) for name in COUNTERS}
+        counts["cache_hits"] = max(0, counts["requests"] - counts["items"])
+        return {"times_ns": {stage: self.times.get(stage, 0) for stage in STAGES}, "counts": counts}
+
+def format_table(profile):
+    s = profile.summary()
+    times, counts = s["times_ns"], s["counts"]
+    total = times["total"] or 1
+    items = counts["items"] or 1
+    lines = [f"{'stage':<10} {'total ms':>10} {'share':>7} {'us/item':>9}"]
+    for stage in STAGES:
+        ns = times[stage]
+        lines.append(f"{stage:<10} {ns / 1e6:>10.1f} {ns / total:>7.1%} {ns / items / 1e3:>9.2f}")
+    lines.append("")
+    for name in COUNTERS:
+        lines.append(f"{name:<18} {counts[name]:>12,}")
+    return "\n".join(lines) + "\n"
+
+def format_json(profile):
+    return json.dumps(profile.summary(), indent=2) + "\n"
+
+def format_prometheus(profile, prefix=METRIC_PREFIX):
+    s = profile.summary()
+    lines = [
+        f"# HELP {prefix}_stage_seconds_total Time spent in each stage of translate_item_auto.",
+        f"# TYPE {prefix}_stage_seconds_total counter",
+    ]
+    for stage, ns in s["times_ns"].items():
+        lines.append(f'{prefix}_stage_seconds_total{{stage="{stage}"}} {ns / 1e9:.9f}')
+    for name, n in s["counts"].items():
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        lines.append(f"{prefix}_{name}_total {n}")
+    return "\n".join(lines) + "\n"
+
+FORMATTERS = {"table": format_table, "json": format_json, "prometheus": format_prometheus}
+
+def export(profile, fmt="table"):
+    return FORMATTERS[fmt](profile)
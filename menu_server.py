@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+import level4_menu_translator as engine
+from menu_batch import init_worker, translate_lines, use_compact_lexicon, worker_compact
+from menu_lexicon import share_lexicon, unshare_lexicon
+
+MAX_BODY = 1 << 20
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+class MicroBatcher:
+    def __init__(self, executor, max_batch=256, max_delay=0.002):
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pending = []
+        self.timer = None
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, items):
+        loop = asyncio.get_running_loop()
+        futures = []
+        for item in items:
+            fut = loop.create_future()
+            self.pending.append((item, fut))
+            futures.append(fut)
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.max_delay, self.flush)
+        return futures
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        while self.pending:
+            batch = self.pending[:self.max_batch]
+            del self.pending[:self.max_batch]
+            asyncio.ensure_future(self.run(batch))
+
+    async def run(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        loop = asyncio.get_running_loop()
+        try:
+            out = await loop.run_in_executor(self.executor, translate_lines, [item for item, _ in batch])
+        except Exception as exc:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+        for (_, fut), tr in zip(batch, out):
+            if not fut.done():
+                fut.set_result(tr)
+
+    async def translate(self, items):
+        return await asyncio.gather(*self.submit(items))
+
+class TranslationServer:
+    def __init__(self, batcher, keepalive=15.0):
+        self.batcher = batcher
+        self.keepalive = keepalive
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self.keepalive)
+                except asyncio.TimeoutError:
+                    break
+                if not line.strip():
+                    break
+                parts = line.decode("latin-1").split()
+                if len(parts) != 3:
+                    await self.respond(writer, 400, {"error": "bad request line"}, False)
+                    break
+                method, target, version = parts
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                conn = headers.get("connection", "").lower()
+                keep_alive = conn == "keep-alive" if version == "HTTP/1.0" else conn != "close"
+                if "transfer-encoding" in headers:
+                    await self.respond(writer, 411, {"error": "send a Content-Length"}, False)
+                    break
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0 or length > MAX_BODY:
+                    await self.respond(writer, 413 if length > 0 else 400, {"error": "bad Content-Length"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.dispatch(method, urlsplit(target).path, body)
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def dispatch(self, method, path, body):
+        self.requests += 1
+        if path == "/health":
+            return 200, {"status": "ok", "lexicon": engine.LEXICON_VERSION}
+        if path == "/stats":
+            return 200, {"requests": self.requests, "batches": self.batcher.batches, "items": self.batcher.items}
+        if path not in ("/translate", "/translate/batch"):
+            return 404, {"error": f"no such endpoint: {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400, {"error": "body is not valid JSON"}
+        if path == "/translate":
+            text = data.get("text") if isinstance(data, dict) else None
+            if not isinstance(text, str):
+                return 400, {"error": 'expected {"text": "..."}'}
+            items = [text]
+        else:
+            items = data.get("items") if isinstance(data, dict) else None
+            if not isinstance(items, list) or not all(isinstance(x, str) for x in items):
+                return 400, {"error": 'expected {"items": ["...", ...]}'}
+        try:
+            out = await self.batcher.translate(items)
+        except Exception as exc:
+            return 500, {"error": str(exc)}
+        if path == "/translate":
+            return 200, {"translation": out[0]}
+        return 200, {"translations": out}
+
+async def serve(host="127.0.0.1", port=8080, workers=1, max_batch=256, max_delay=0.002,
+                cache_size=100000, cache_db=None, keepalive=15.0, watch=0, compact=False, shared_lexicon=False):
+    if compact:
+        use_compact_lexicon()
+    shared = share_lexicon() if shared_lexicon else None
+    executor = ProcessPoolExecutor(workers or os.cpu_count(), initializer=init_worker,
+                                   initargs=(worker_compact(), cache_size, "lru", cache_db, watch))
+    try:
+        server = TranslationServer(MicroBatcher(executor, max_batch, max_delay), keepalive)
+        srv = await asyncio.start_server(server.handle, host, port)
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass
+        addrs = ", ".join(f"{a[0]}:{a[1]}" for a in (s.getsockname() for s in srv.sockets))
+        print(f"Serving on {addrs} with {workers or os.cpu_count()} worker(s)", file=sys.stderr, flush=True)
+        async with srv:
+            await srv.serve_forever()
+    finally:
+        executor.shutdown(cancel_futures=True)
+        if shared is not None:
+            unshare_lexicon(shared)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="HTTP service for the menu translator (PT <-> EN).")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("-j", "--workers", type=int, default=1, help="translation processes (0 = one per CPU, default: 1)")
+    ap.add_argument("--max-batch", type=int, default=256, help="items per worker task (default: 256)")
+    ap.add_argument("--max-delay-ms", type=float, default=2.0, help="how long to wait for more items before dispatching a batch (default: 2)")
+    ap.add_argument("--cache-size", type=int, default=100000, help="translations memoized per worker (0 = off, default: 100000)")
+    ap.add_argument("--cache-db", help="SQLite file for a persistent cache shared across runs and workers")
+    ap.add_argument("--keepalive", type=float, default=15.0, help="seconds an idle connection is kept open (default: 15)")
+    ap.add_argument("--watch", type=float, default=0, metavar="SECONDS",
+                    help="check the lexicon files this often and apply changes without a restart (default: off)")
+    ap.add_argument("--compact", action="store_true",
+                    help="keep the lexicon as interned IDs in packed arrays, shared copy-on-write with the workers")
+    ap.add_argument("--shared-lexicon", action="store_true",
+                    help="put the lexicon in shared memory once and let the workers attach to it")
+    args = ap.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, max(1, args.max_batch), args.max_delay_ms / 1000,
+                          args.cache_size, args.cache_db, args.keepalive, args.watch, args.compact, args.shared_lexicon))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+if __name__ == "__main__":
+    main()
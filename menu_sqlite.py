@@ -0,0 +1,140 @@
+import argparse
+import hashlib
+import sqlite3
+import sys
+import time
+
+from menu_batch import make_pool, pool_translate, set_cache, translate_lines
+
+STATE_TABLE = "menu_translation_state"
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def source_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({quote(table)})")]
+
+class MenuTable:
+    def __init__(self, path, table, source, target, key="rowid", timeout=30.0):
+        self.table = table
+        self.source = source
+        self.target = target
+        self.key = key
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        cols = table_columns(self.conn, table)
+        if not cols:
+            raise ValueError(f"no such table: {table}")
+        for name in (source, key):
+            if name != "rowid" and name not in cols:
+                raise ValueError(f"no column {name} in {table}")
+        if target == source or target == key:
+            raise ValueError("the target column must differ from the source and key columns")
+        if target not in cols:
+            self.conn.execute(f"ALTER TABLE {quote(table)} ADD COLUMN {quote(target)} TEXT")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} ("
+            "tbl TEXT NOT NULL, source TEXT NOT NULL, target TEXT NOT NULL, row_key NOT NULL, hash TEXT NOT NULL, "
+            "PRIMARY KEY (tbl, source, target, row_key)) WITHOUT ROWID"
+        )
+        k = "rowid" if key == "rowid" else quote(key)
+        # row_key has no type affinity; the unary + keeps t's affinity off the comparison so the primary key is used
+        select = (
+            f"SELECT t.{k}, t.{quote(source)}, s.hash FROM {quote(table)} AS t "
+            f"LEFT JOIN {STATE_TABLE} AS s ON s.tbl = ? AND s.source = ? AND s.target = ? AND s.row_key = +t.{k} "
+        )
+        self.first_page = select + f"ORDER BY t.{k} LIMIT ?"
+        self.next_page = select + f"WHERE t.{k} > ? ORDER BY t.{k} LIMIT ?"
+        self.update = f"UPDATE {quote(table)} SET {quote(target)} = ? WHERE {k} = ?"
+
+    def pages(self, size=5000):
+        names = (self.table, self.source, self.target)
+        rows = self.conn.execute(self.first_page, (*names, size)).fetchall()
+        while rows:
+            yield rows
+            if len(rows) < size:
+                break
+            rows = self.conn.execute(self.next_page, (*names, rows[-1][0], size)).fetchall()
+
+    def changed(self, size=5000, force=False):
+        for rows in self.pages(size):
+            out = []
+            skipped = 0
+            for key, text, old in rows:
+                if not isinstance(text, str):
+                    skipped += 1
+                    continue
+                h = source_hash(text)
+                if force or h != old:
+                    out.append((key, text, h))
+            yield len(rows), skipped, out
+
+    def write(self, rows, translations):
+        names = (self.table, self.source, self.target)
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(self.update, [(tr, key) for (key, _, _), tr in zip(rows, translations)])
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {STATE_TABLE} VALUES (?, ?, ?, ?, ?)",
+                [(*names, key, h) for key, _, h in rows],
+            )
+
+    def close(self):
+        self.conn.close()
+
+def translate_table(db, translate=translate_lines, batch_size=5000, force=False):
+    stats = {"rows": 0, "translated": 0, "unchanged": 0, "skipped": 0}
+    for scanned, skipped, rows in db.changed(batch_size, force):
+        if rows:
+            db.write(rows, translate([text for _, text, _ in rows]))
+        stats["rows"] += scanned
+        stats["translated"] += len(rows)
+        stats["skipped"] += skipped
+        stats["unchanged"] += scanned - skipped - len(rows)
+    return stats
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Translate a column of a SQLite menu table in place (PT <-> EN).")
+    ap.add_argument("database", help="SQLite database file")
+    ap.add_argument("--table", required=True)
+    ap.add_argument("--source", required=True, help="column holding the menu text")
+    ap.add_argument("--target", required=True, help="column the translations are written to (added if missing)")
+    ap.add_argument("--key", default="rowid", help="unique column used to page through the table (default: rowid)")
+    ap.add_argument("--batch-size", type=int, default=5000, help="rows read and written per transaction (default: 5000)")
+    ap.add_argument("-j", "--workers", type=int, default=1, help="worker processes (0 = one per CPU, default: 1)")
+    ap.add_argument("--chunk-size", type=int, default=500, help="items sent to a worker per task (default: 500)")
+    ap.add_argument("--cache-size", type=int, default=100000, help="translations memoized per process (0 = off, default: 100000)")
+    ap.add_argument("--force", action="store_true", help="translate every row, even if its source text has not changed")
+    ap.add_argument("-q", "--quiet", action="store_true", help="do not report progress")
+    args = ap.parse_args(argv)
+
+    try:
+        db = MenuTable(args.database, args.table, args.source, args.target, args.key)
+    except (ValueError, sqlite3.Error) as exc:
+        ap.error(str(exc))
+    workers = args.workers or None
+    pool = None
+    if workers is None or workers > 1:
+        pool = make_pool(workers, args.cache_size)
+        translate = lambda texts: pool_translate(pool, texts, max(1, args.chunk_size))
+    else:
+        set_cache(args.cache_size, compiled=True)
+        translate = translate_lines
+    start = time.perf_counter()
+    try:
+        stats = translate_table(db, translate, max(1, args.batch_size), args.force)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        db.close()
+    elapsed = time.perf_counter() - start
+    if not args.quiet:
+        rate = stats["translated"] / elapsed if elapsed > 0 else 0.0
+        print(f"{stats['rows']} rows: {stats['translated']} translated, {stats['unchanged']} unchanged, {stats['skipped']} skipped (not text) "
+              f"in {elapsed:.2f}s ({rate:,.0f} items/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
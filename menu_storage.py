@@ -0,0 +1,410 @@
+import json
+import mmap
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from collections.abc import Mapping
+
+LEXICON_MAGIC = b"MTLX"
+LEXICON_FORMAT = 4
+PACKED_MEMO_SIZE = 50000
+COMPACT_TABLES = {
+    "PT_EN": "I", "EN_PT": "I", "NORM_PT_EN": "I", "NORM_EN_PT": "I",
+    "PLURAL_PT_EN": "I", "PLURAL_EN_PT": "I",
+    "WORD_LANG": "f", "TRIGRAMS": "d",
+    "PHRASES_PT_EN": "phrases", "PHRASES_EN_PT": "phrases", "NORM_PH_PT_EN": "phrases", "NORM_PH_EN_PT": "phrases",
+    "WORDS": "index", "PHRASES": "index",
+}
+TABLES = (
+    "PT_EN", "EN_PT", "PHRASES_PT_EN", "PHRASES_EN_PT",
+    "NORM_PT_EN", "NORM_EN_PT", "NORM_PH_PT_EN", "NORM_PH_EN_PT",
+    "PLURAL_PT_EN", "PLURAL_EN_PT", "UNCOUNTABLE_EN", "UNCOUNTABLE_PT",
+    "WORDS_PT", "WORDS_EN", "PHRASES_PT", "PHRASES_EN", "TRIGRAMS", "WORD_LANG",
+)
+
+COMPILED = {}
+
+Entry = namedtuple("Entry", "pt en pos number pref")
+
+def encode(s):
+    return s.encode("utf-8", "surrogatepass")
+
+def encode_entries(cands):
+    return "\x1e".join("\x1f".join((e.pt, e.en, e.pos, e.number, "1" if e.pref else "")) for e in cands)
+
+def pack_table(mapping):
+    if not isinstance(mapping, Mapping):
+        mapping = dict.fromkeys(sorted(mapping), "")
+    kind = None
+    if any(isinstance(v, tuple) for v in mapping.values()):
+        mapping = {k: encode_entries(v) for k, v in mapping.items()}
+        kind = "entries"
+    elif any(isinstance(v, float) for v in mapping.values()):
+        mapping = {k: repr(v) for k, v in mapping.items()}
+        kind = "float"
+    count = len(mapping)
+    nslots = 8
+    while nslots * 3 < count * 4:
+        nslots *= 2
+    offs = array("I", [0])
+    slots = array("I", [0]) * nslots
+    blob = bytearray()
+    for idx, (k, v) in enumerate(mapping.items()):
+        kb = encode(k)
+        blob += kb
+        offs.append(len(blob))
+        blob += encode(v)
+        offs.append(len(blob))
+        i = zlib.crc32(kb) & (nslots - 1)
+        while slots[i]:
+            i = (i + 1) & (nslots - 1)
+        slots[i] = idx + 1
+    blob += b"\0" * (-len(blob) % 8)
+    section = offs.tobytes() + slots.tobytes() + bytes(blob)
+    meta = {"count": count, "slots": nslots, "blob": len(blob)}
+    if kind:
+        meta["kind"] = kind
+    return section, meta
+
+def pack_lexicon(tables, version, sources):
+    tables = dict(tables)
+    for name in ("WORDS", "PHRASES"):
+        tables[name + "_PT"] = tables[name].pt
+        tables[name + "_EN"] = tables[name].en
+    body = bytearray()
+    meta = {}
+    for name in TABLES:
+        section, m = pack_table(tables[name])
+        m["offset"] = len(body)
+        meta[name] = m
+        body += section
+    header = json.dumps({
+        "byteorder": sys.byteorder,
+        "version": version,
+        "sources": sources,
+        "tables": meta,
+    }).encode("utf-8")
+    image = bytearray(LEXICON_MAGIC)
+    image += LEXICON_FORMAT.to_bytes(4, "little")
+    image += len(header).to_bytes(4, "little")
+    image += header
+    image += b"\0" * (lexicon_data_offset(len(header)) - 12 - len(header))
+    image += body
+    return image
+
+class PackedTable(Mapping):
+    def __init__(self, path, name, buf, meta):
+        self.path = path
+        self.name = name
+        view = memoryview(buf)
+        offs = meta["offset"]
+        count = meta["count"]
+        nslots = meta["slots"]
+        self.count = count
+        self.mask = nslots - 1
+        self.offs = view[offs:offs + (2 * count + 1) * 4].cast("I")
+        offs += (2 * count + 1) * 4
+        self.slots = view[offs:offs + nslots * 4].cast("I")
+        offs += nslots * 4
+        self.blob = view[offs:offs + meta["blob"]]
+        self.memo = {}
+
+    def __reduce__(self):
+        return open_table, (self.path, self.name)
+
+    def find(self, key):
+        kb = key.encode("utf-8", "surrogatepass")
+        offs = self.offs
+        blob = self.blob
+        i = zlib.crc32(kb) & self.mask
+        while True:
+            e = self.slots[i]
+            if not e:
+                return -1
+            e = (e - 1) * 2
+            if blob[offs[e]:offs[e + 1]] == kb:
+                return e
+            i = (i + 1) & self.mask
+
+    def value(self, e):
+        return str(self.blob[self.offs[e + 1]:self.offs[e + 2]], "utf-8", "surrogatepass")
+
+    def lookup(self, key):
+        e = self.find(key)
+        v = None if e < 0 else self.value(e)
+        if len(self.memo) >= PACKED_MEMO_SIZE:
+            self.memo.clear()
+        self.memo[key] = v
+        return v
+
+    def get(self, key, default=None):
+        v = self.memo.get(key, self)
+        if v is self:
+            v = self.lookup(key)
+        return default if v is None else v
+
+    def __getitem__(self, key):
+        v = self.get(key)
+        if v is None:
+            raise KeyError(key)
+        return v
+
+    def __contains__(self, key):
+        v = self.memo.get(key, self)
+        if v is self:
+            v = self.lookup(key)
+        return v is not None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        offs = self.offs
+        for e in range(0, 2 * self.count, 2):
+            yield str(self.blob[offs[e]:offs[e + 1]], "utf-8", "surrogatepass")
+
+def decode_entries(s):
+    cands = []
+    for f in s.split("\x1e"):
+        pt, en, pos, number, pref = f.split("\x1f")
+        cands.append(Entry(pt, en, pos, number, pref == "1"))
+    return tuple(cands)
+
+class EntryTable(PackedTable):
+    def value(self, e):
+        return decode_entries(super().value(e))
+
+class FloatTable(PackedTable):
+    def value(self, e):
+        return float(super().value(e))
+
+def lexicon_data_offset(header_size):
+    return (12 + header_size + 7) // 8 * 8
+
+def open_compiled(path):
+    if path not in COMPILED:
+        with open(path, "rb") as fh:
+            buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if buf[:4] != LEXICON_MAGIC:
+            raise ValueError(f"{path} is not a compiled lexicon")
+        fmt = int.from_bytes(buf[4:8], "little")
+        size = int.from_bytes(buf[8:12], "little")
+        header = json.loads(bytes(buf[12:12 + size]))
+        if fmt != LEXICON_FORMAT or header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was compiled for another format or platform")
+        data = memoryview(buf)[lexicon_data_offset(size):]
+        tables = {}
+        for name, meta in header["tables"].items():
+            table = {"entries": EntryTable, "float": FloatTable}.get(meta.get("kind"), PackedTable)
+            tables[name] = table(path, name, data, meta)
+        COMPILED[path] = header, tables
+    return COMPILED[path]
+
+def open_table(path, name):
+    return open_compiled(path)[1][name]
+
+class StringPool:
+    def __init__(self, strings):
+        self.strings = sorted(set(strings))
+
+    def index(self):
+        return {s: i for i, s in enumerate(self.strings)}
+
+    def find(self, s):
+        strings = self.strings
+        i = bisect_left(strings, s)
+        return i if i < len(strings) and strings[i] == s else None
+
+    def word_ids(self, s):
+        out = []
+        for w in s.split(" "):
+            i = self.find(w)
+            if i is None:
+                return None
+            out.append(i)
+        return out
+
+class CompactTable(Mapping):
+    def __init__(self, pool, index, mapping, typecode="I"):
+        if typecode == "I":
+            pairs = sorted((index[k], index[v]) for k, v in mapping.items())
+        else:
+            pairs = sorted((index[k], v) for k, v in mapping.items())
+        self.pool = pool
+        self.key_ids = array("I", [k for k, _ in pairs])
+        self.value_ids = array(typecode, [v for _, v in pairs])
+        self.interned = typecode == "I"
+
+    def find(self, key):
+        i = self.pool.find(key)
+        if i is None:
+            return -1
+        key_ids = self.key_ids
+        j = bisect_left(key_ids, i)
+        return j if j < len(key_ids) and key_ids[j] == i else -1
+
+    def get(self, key, default=None):
+        j = self.find(key)
+        if j < 0:
+            return default
+        return self.pool.strings[self.value_ids[j]] if self.interned else self.value_ids[j]
+
+    def __getitem__(self, key):
+        j = self.find(key)
+        if j < 0:
+            raise KeyError(key)
+        return self.pool.strings[self.value_ids[j]] if self.interned else self.value_ids[j]
+
+    def __contains__(self, key):
+        return self.find(key) >= 0
+
+    def __len__(self):
+        return len(self.key_ids)
+
+    def __iter__(self):
+        strings = self.pool.strings
+        return (strings[k] for k in self.key_ids)
+
+class EntryColumns:
+    def __init__(self, pool, index, entries):
+        self.pool = pool
+        self.pt = array("I", [index[e.pt] for e in entries])
+        self.en = array("I", [index[e.en] for e in entries])
+        self.pos = array("I", [index[e.pos] for e in entries])
+        self.number = array("I", [index[e.number] for e in entries])
+        self.pref = array("B", [e.pref for e in entries])
+
+    def entry(self, i):
+        strings = self.pool.strings
+        return Entry(strings[self.pt[i]], strings[self.en[i]], strings[self.pos[i]], strings[self.number[i]],
+                     bool(self.pref[i]))
+
+class EntryIndex(CompactTable):
+    def __init__(self, pool, index, mapping, columns, entry_ids):
+        rows = sorted((index[k], [entry_ids[e] for e in cands]) for k, cands in mapping.items())
+        self.pool = pool
+        self.columns = columns
+        self.key_ids = array("I", [k for k, _ in rows])
+        self.starts = array("I", [0])
+        self.entry_ids = array("I")
+        for _, ids in rows:
+            self.entry_ids.extend(ids)
+            self.starts.append(len(self.entry_ids))
+
+    def value(self, j):
+        entry = self.columns.entry
+        return tuple(entry(i) for i in self.entry_ids[self.starts[j]:self.starts[j + 1]])
+
+    def get(self, key, default=None):
+        j = self.find(key)
+        return default if j < 0 else self.value(j)
+
+    def __getitem__(self, key):
+        j = self.find(key)
+        if j < 0:
+            raise KeyError(key)
+        return self.value(j)
+
+def compact_index(pool, index, bi):
+    entries = list(dict.fromkeys(e for side in (bi.pt, bi.en) for cands in side.values() for e in cands))
+    entry_ids = {e: i for i, e in enumerate(entries)}
+    columns = EntryColumns(pool, index, entries)
+    return type(bi)(EntryIndex(pool, index, bi.pt, columns, entry_ids), EntryIndex(pool, index, bi.en, columns, entry_ids))
+
+def phrase_hash(ids):
+    return hash(tuple(ids)) & 0xFFFFFFFFFFFFFFFF
+
+def phrase_words(key):
+    words = key.split(" ")
+    return words if all(words) else None
+
+class PhraseTable(Mapping):
+    def __init__(self, pool, index, mapping):
+        rows = []
+        self.extra = {}
+        for k, v in mapping.items():
+            words = phrase_words(k)
+            if words is None:
+                self.extra[k] = v
+                continue
+            ids = [index[w] for w in words]
+            rows.append((phrase_hash(ids), ids, index[v]))
+        rows.sort()
+        self.pool = pool
+        self.hashes = array("Q", [h for h, _, _ in rows])
+        self.starts = array("I", [0])
+        self.words = array("I")
+        for _, ids, _ in rows:
+            self.words.extend(ids)
+            self.starts.append(len(self.words))
+        self.value_ids = array("I", [v for _, _, v in rows])
+
+    def find(self, key):
+        ids = self.pool.word_ids(key)
+        if ids is None:
+            return -1
+        h = phrase_hash(ids)
+        hashes = self.hashes
+        j = bisect_left(hashes, h)
+        while j < len(hashes) and hashes[j] == h:
+            if self.words[self.starts[j]:self.starts[j + 1]].tolist() == ids:
+                return j
+            j += 1
+        return -1
+
+    def get(self, key, default=None):
+        j = self.find(key)
+        if j >= 0:
+            return self.pool.strings[self.value_ids[j]]
+        return self.extra.get(key, default)
+
+    def __getitem__(self, key):
+        v = self.get(key)
+        if v is None:
+            raise KeyError(key)
+        return v
+
+    def __contains__(self, key):
+        return self.find(key) >= 0 or key in self.extra
+
+    def __len__(self):
+        return len(self.value_ids) + len(self.extra)
+
+    def __iter__(self):
+        strings = self.pool.strings
+        words = self.words
+        starts = self.starts
+        for j in range(len(self.value_ids)):
+            yield " ".join(strings[w] for w in words[starts[j]:starts[j + 1]])
+        yield from self.extra
+
+def table_strings(table, kind):
+    if kind == "index":
+        for side in (table.pt, table.en):
+            for k, cands in side.items():
+                yield k
+                for e in cands:
+                    yield from e[:4]
+        return
+    for k, v in table.items():
+        if kind == "phrases":
+            yield from phrase_words(k) or ()
+        else:
+            yield k
+        if kind in ("I", "phrases"):
+            yield v
+
+def compact_lexicon(tables):
+    pool = StringPool(s for name, kind in COMPACT_TABLES.items() for s in table_strings(tables[name], kind))
+    index = pool.index()
+    out = dict(tables)
+    for name, kind in COMPACT_TABLES.items():
+        if kind == "phrases":
+            out[name] = PhraseTable(pool, index, tables[name])
+        elif kind == "index":
+            out[name] = compact_index(pool, index, tables[name])
+        else:
+            out[name] = CompactTable(pool, index, tables[name], kind)
+    return out